@@ -1,8 +1,8 @@
 # Copyright 2022 Berezi Amubieta - AvanzOSC
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
 from odoo import _, api, fields, models
+from collections import defaultdict
 from datetime import datetime
-from dateutil import rrule
 from _datetime import timedelta
 from odoo.exceptions import ValidationError
 
@@ -113,7 +113,7 @@ class MrpProduction(models.Model):
         compute="_compute_clasified_date")
     real_average_weight = fields.Float(
         string="Real Average Weight",
-        compute="_compute_real_average_weight",
+        compute="_compute_move_line_kpis",
         store=True,
         digits="Weight Decimal Precision")
     unload_date = fields.Datetime(
@@ -126,11 +126,11 @@ class MrpProduction(models.Model):
         store=True)
     unit_difference = fields.Integer(
         string="Unit Difference",
-        compute="_compute_unit_difference",
+        compute="_compute_move_line_kpis",
         store=True)
     total_unit = fields.Float(
         string="Units",
-        compute="_compute_total_unit",
+        compute="_compute_move_line_kpis",
         store=True)
     average_weight = fields.Float(
         string="Average Weight",
@@ -138,7 +138,7 @@ class MrpProduction(models.Model):
         store=True)
     gross_yield = fields.Float(
         string="Gross Yield",
-        compute="_compute_gross_yield",
+        compute="_compute_move_line_kpis",
         store=True)
     descarga_order = fields.Char(
         string="Descarga Order",
@@ -213,40 +213,95 @@ class MrpProduction(models.Model):
         store=True)
     asphyxiation_units = fields.Integer(
         string="Asphyxiated",
-        compute="_compute_asphyxiation_units")
+        compute="_compute_move_line_units")
     seized_units = fields.Integer(
         string="Seized",
-        compute="_compute_seized_units")
+        compute="_compute_move_line_units")
     rto_percentage = fields.Float(
         string="Rto. %",
-        compute="_compute_rto_percentage")
-
-    def _compute_rto_percentage(self):
+        compute="_compute_move_line_units")
+
+    def _get_move_line_totals(self):
+        """Sum the move lines of the productions in one grouped read.
+
+        Returns, by production, the number of move lines, their units, done
+        quantity and percentage, and the seized and asphyxiated units.
+        """
+        totals = defaultdict(lambda: dict.fromkeys(
+            ("count", "unit", "qty_done", "percentage", "seized_unit",
+             "asphyxiated_unit"), 0))
+        productions = self.filtered("id")
+        for production in self - productions:
+            for line in production.move_line_ids:
+                production._add_move_line_totals(
+                    totals[production.id], line.product_id, 1, line.unit,
+                    line.qty_done, line.percentage)
+        if not productions:
+            return totals
+        groups = self.env["stock.move.line"].read_group(
+            [("production_id", "in", productions.ids)],
+            ["unit", "qty_done", "percentage"],
+            ["production_id", "location_dest_id", "product_id"], lazy=False)
+        products = self.env["product.product"].browse(list({
+            group["product_id"][0] for group in groups
+            if group["product_id"]}))
+        products = {product.id: product for product in products}
+        locations = {
+            production.id: production.production_location_id.id
+            for production in productions}
+        for group in groups:
+            production_id = group["production_id"][0]
+            if not group["location_dest_id"] or (
+                    group["location_dest_id"][0] != locations[production_id]):
+                continue
+            self._add_move_line_totals(
+                totals[production_id],
+                products.get(
+                    group["product_id"] and group["product_id"][0],
+                    self.env["product.product"]),
+                group["__count"], group["unit"] or 0, group["qty_done"] or 0,
+                group["percentage"] or 0)
+        return totals
+
+    @api.model
+    def _add_move_line_totals(self, totals, product, count, unit, qty_done,
+                              percentage):
+        totals["count"] += count
+        totals["unit"] += unit
+        totals["qty_done"] += qty_done
+        totals["percentage"] += percentage
+        if product.chicken_seized:
+            totals["seized_unit"] += unit
+        if product.asphyxiated:
+            totals["asphyxiated_unit"] += unit
+
+    @api.depends("download_unit", "origin_qty", "move_line_ids",
+                 "move_line_ids.unit", "move_line_ids.qty_done")
+    def _compute_move_line_kpis(self):
+        totals = self._get_move_line_totals()
         for line in self:
-            line.rto_percentage = 0
-            if line.move_line_ids:
-                line.rto_percentage = sum(
-                    line.move_line_ids.mapped("percentage"))
+            units = totals[line.id]["unit"]
+            line.total_unit = units
+            line.unit_difference = line.download_unit
+            if totals[line.id]["count"]:
+                line.unit_difference = units - line.download_unit
+            line.real_average_weight = 0
+            if units != 0:
+                line.real_average_weight = line.origin_qty / units
+            line.gross_yield = 0
+            if line.origin_qty != 0:
+                line.gross_yield = totals[line.id]["qty_done"] / (
+                    line.origin_qty)
 
-    def _compute_seized_units(self):
+    def _compute_move_line_units(self):
+        totals = self._get_move_line_totals()
         for line in self:
+            line.rto_percentage = totals[line.id]["percentage"]
             line.seized_units = 0
-            if line.move_line_ids and line.move_line_ids.filtered(
-                lambda c: c.product_id.chicken_seized) and not (
-                    line.quartering):
-                line.seized_units = sum(
-                    line.move_line_ids.filtered(
-                        lambda c: c.product_id.chicken_seized).mapped("unit"))
-
-    def _compute_asphyxiation_units(self):
-        for line in self:
             line.asphyxiation_units = 0
-            if line.move_line_ids and line.move_line_ids.filtered(
-                lambda c: c.product_id.asphyxiated) and not (
-                    line.quartering):
-                line.asphyxiation_units = sum(
-                    line.move_line_ids.filtered(
-                        lambda c: c.product_id.asphyxiated).mapped("unit"))
+            if not line.quartering:
+                line.seized_units = totals[line.id]["seized_unit"]
+                line.asphyxiation_units = totals[line.id]["asphyxiated_unit"]
 
     def _compute_classified_ids(self):
         for line in self:
@@ -269,37 +324,6 @@ class MrpProduction(models.Model):
                 production.produced_qty = sum(
                     production.finished_move_line_ids.mapped("qty_done"))
 
-    @api.depends("move_line_ids", "move_line_ids.qty_done", "origin_qty")
-    def _compute_gross_yield(self):
-        for line in self:
-            line.gross_yield = 0
-            if line.origin_qty != 0:
-                line.gross_yield = sum(
-                    line.move_line_ids.mapped("qty_done")) / line.origin_qty
-
-    @api.depends("move_line_ids", "move_line_ids.unit")
-    def _compute_total_unit(self):
-        for line in self:
-            line.total_unit = 0
-            if line.move_line_ids:
-                line.total_unit = sum(line.move_line_ids.mapped("unit"))
-
-    @api.depends("download_unit", "move_line_ids", "move_line_ids.unit")
-    def _compute_unit_difference(self):
-        for line in self:
-            line.unit_difference = line.download_unit
-            if line.move_line_ids:
-                line.unit_difference = sum(
-                        line.move_line_ids.mapped("unit")) - line.download_unit
-
-    @api.depends("origin_qty", "move_line_ids", "move_line_ids.unit")
-    def _compute_real_average_weight(self):
-        for line in self:
-            line.real_average_weight = 0
-            units = sum(line.move_line_ids.mapped("unit"))
-            if units != 0:
-                line.real_average_weight = line.origin_qty / units
-
     def _compute_clasified_date(self):
         for line in self:
             line.clasified_date = False
@@ -324,21 +348,39 @@ class MrpProduction(models.Model):
         for line in self:
             line.birth_difference = line.product_qty - line.expected_birth
 
-    @api.depends("batch_id", "batch_id.birth_rate_ids", "product_qty",
+    @api.depends("batch_id", "batch_id.birth_rate_ids",
+                 "batch_id.birth_rate_ids.birth_start_date",
+                 "batch_id.birth_rate_ids.percentage_birth", "product_qty",
                  "birth_date")
     def _compute_expected_birth(self):
+        calendars = {}
         for line in self:
             line.expected_birth = 0
-            if line.birth_date:
-                rate = line.batch_id.birth_rate_ids.filtered(
-                    lambda c: c.birth_start_date and c.birth_start_date <= (
-                        line.birth_date) and (
-                            c.birth_start_date + timedelta(days=7)) > (
-                                line.birth_date))
-                if rate:
-                    line.expected_rate = rate[0].percentage_birth
-                    line.expected_birth = (
-                        line.product_qty * rate[0].percentage_birth) / 100
+            line.expected_rate = 0
+            if line.birth_date and line.batch_id:
+                if line.batch_id not in calendars:
+                    calendars[line.batch_id] = self._get_birth_rate_calendar(
+                        line.batch_id)
+                rate = calendars[line.batch_id].get(line.birth_date)
+                if rate is not None:
+                    line.expected_rate = rate
+                    line.expected_birth = (line.product_qty * rate) / 100
+
+    @api.model
+    def _get_birth_rate_calendar(self, batch):
+        """Birth rate of each day of the mother.
+
+        A rate applies to the 7 days from its start date, when two rates
+        overlap the first one is used.
+        """
+        calendar = {}
+        for rate in batch.birth_rate_ids:
+            if rate.birth_start_date:
+                for day in range(7):
+                    calendar.setdefault(
+                        rate.birth_start_date + timedelta(days=day),
+                        rate.percentage_birth)
+        return calendar
 
     @api.depends("product_qty", "consume_qty")
     def _compute_birth_rate(self):
@@ -368,15 +410,78 @@ class MrpProduction(models.Model):
                 line.birth_week = week
 
     def weeks_between(self, start_date, end_date):
-        weeks = rrule.rrule(rrule.WEEKLY, dtstart=start_date, until=end_date)
-        return weeks.count()
+        if end_date < start_date:
+            return 0
+        return (end_date - start_date).days // 7 + 1
+
+    def _get_reproductor_quant_domain(self):
+        domain = [("egg", "=", True), ("is_hatchery", "=", True)]
+        batches = self.mapped("batch_id")
+        if batches:
+            domain.append(("lot_id.batch_id", "in", batches.ids))
+        return domain
 
     def _compute_reproductor_quant_ids(self):
+        quant_obj = self.env["stock.quant"].sudo()
+        quant_ids = defaultdict(list)
+        batches = self.mapped("batch_id")
+        if batches:
+            for quant in quant_obj.search(
+                    self.filtered("batch_id")._get_reproductor_quant_domain()):
+                quant_ids[quant.lot_id.batch_id.id].append(quant.id)
+        if self.filtered(lambda c: not c.batch_id):
+            quant_ids[False] = quant_obj.search(
+                self.browse()._get_reproductor_quant_domain()).ids
+        for production in self:
+            production.reproductor_quant_ids = quant_obj.browse(
+                quant_ids[production.batch_id.id])
+
+    @api.model
+    def _get_template_boms(self, templates):
+        """First BoM of each product template, read with one search."""
+        boms = {}
+        for bom in self.env["mrp.bom"].search(
+                [("product_tmpl_id", "in", templates.ids)],
+                order="sequence, id"):
+            boms.setdefault(bom.product_tmpl_id, bom)
+        return boms
+
+    @api.model
+    def _create_saca_productions(self, vals_list):
+        """Create the productions of a saca at once.
+
+        The company onchanges are played on a new record per production, as
+        their values may depend on the quantity or the lot, and all the
+        productions are created with a single call.
+        """
+        create_values = []
+        for vals in vals_list:
+            new_production = self.new(vals)
+            for comp_onchange in new_production._onchange_methods["company_id"]:
+                comp_onchange(new_production)
+            create_values.append(
+                new_production._convert_to_write(new_production._cache))
+        productions = self.create(create_values)
+        productions._apply_saca_onchanges()
+        return productions
+
+    def _apply_saca_onchanges(self):
         for production in self:
-            production.reproductor_quant_ids = (
-                self.env["stock.quant"].sudo().search([])).filtered(
-                    lambda c: c.product_id.egg is True and (
-                        c.location_id.is_hatchery is True))
+            production.onchange_product_id()
+            production._onchange_product_qty()
+            production._onchange_bom_id()
+            production._onchange_move_raw()
+        self._check_is_deconstruction()
+        for production in self:
+            production._onchange_location()
+            production._onchange_location_dest()
+            production._onchange_date_planned_start()
+            production._onchange_move_finished_product()
+            production._onchange_move_finished()
+            production._onchange_lot_producing()
+            production._onchange_workorder_ids()
+            production._check_production_lines()
+            production._create_update_move_finished()
 
     @api.onchange("picking_type_id")
     def onchange_picking_type(self):
@@ -430,86 +535,125 @@ class MrpProduction(models.Model):
                 raise ValidationError(
                     _("No lot has been put on.")
                     )
-            production.move_line_ids.unlink()
+        self.mapped("move_line_ids").unlink()
+        line_values = []
+        for production in self:
+            quantities = {}
             for quant in production.reproductor_quant_ids:
                 if (
                     quant.available_quantity > 0) and (
                         quant.lot_id.batch_id == production.batch_id):
-                    line = production.move_line_ids.filtered(
-                        lambda c: c.product_id == quant.product_id and (
-                            c.location_id == quant.location_id) and (
-                                c.lot_id == quant.lot_id))
-                    if line:
-                        line.qty_done += quant.available_quantity
-                    if not line:
-                        self.env["stock.move.line"].create(
-                            {"product_id": quant.product_id.id,
-                             "location_id": quant.location_id.id,
-                             "location_dest_id": (
-                                 production.production_location_id.id),
-                             "product_uom_id": quant.product_id.uom_id.id,
-                             "qty_done": quant.available_quantity,
-                             "lot_id": quant.lot_id.id,
-                             "batch_id": production.batch_id.id,
-                             "standard_price": quant.product_id.standard_price,
-                             "amount": (
-                                 quant.available_quantity) * (
-                                     quant.product_id.standard_price),
-                             "company_id": production.company_id.id,
-                             "production_id": production.id,
-                             "move_id": production.move_raw_ids.filtered(
-                                 lambda c: c.product_id == quant.product_id
-                                 ).id})
+                    key = (quant.product_id, quant.location_id, quant.lot_id)
+                    quantities[key] = quantities.get(
+                        key, 0) + quant.available_quantity
+            moves = {}
+            for move in production.move_raw_ids:
+                moves.setdefault(move.product_id, move)
+            line_values.extend(
+                production._prepare_emptying_hatcher_line_values(
+                    product, location, lot, qty_done,
+                    moves.get(product, self.env["stock.move"]))
+                for (product, location, lot), qty_done in (
+                    quantities.items()))
+        self.env["stock.move.line"].create(line_values)
+
+    def _prepare_emptying_hatcher_line_values(self, product, location, lot,
+                                              qty_done, move):
+        self.ensure_one()
+        return {
+            "product_id": product.id,
+            "location_id": location.id,
+            "location_dest_id": self.production_location_id.id,
+            "product_uom_id": product.uom_id.id,
+            "qty_done": qty_done,
+            "lot_id": lot.id,
+            "batch_id": self.batch_id.id,
+            "standard_price": product.standard_price,
+            "amount": qty_done * product.standard_price,
+            "company_id": self.company_id.id,
+            "production_id": self.id,
+            "move_id": move.id}
 
     def action_view_reproductor_quant_ids(self):
+        self.ensure_one()
         context = self.env.context.copy()
         context.update({"search_default_locationgroup": 1})
         return {
             "name": _("Hatcheries"),
             "view_mode": "tree,form",
             "res_model": "stock.quant",
-            "domain": [("id", "in", self.reproductor_quant_ids.ids)],
+            "domain": self._get_reproductor_quant_domain(),
             "type": "ir.actions.act_window",
             "context": context
         }
 
     def action_confirm(self):
         super(MrpProduction, self).action_confirm()
-        for production in self:
-            if production.move_line_ids:
-                for line in production.move_line_ids:
-                    if line.product_id.tracking != "none" and (
-                        production.lot_producing_id) and not (
-                            line.lot_id):
-                        lot = self.env["stock.production.lot"].search(
-                            [("name", "=", production.lot_producing_id.name),
-                             ("product_id", "=", line.product_id.id)],
-                            limit=1).id
-                        if not lot:
-                            lot = self.env[(
-                                "stock.production.lot")].action_create_lot(
-                                    line.product_id,
-                                    production.lot_producing_id.name,
-                                    production.company_id).id
-                        line.lot_id = lot
+        self._assign_producing_lots()
+
+    def _assign_producing_lots(self):
+        """Put the producing lot on the tracked move lines without lot.
+
+        The lots are searched at once by name and product, only the missing
+        ones are created one by one, and the lines of each lot are written at
+        once.
+        """
+        line_ids = defaultdict(list)
+        companies = {}
+        for production in self.filtered("lot_producing_id"):
+            for line in production.move_line_ids:
+                if line.product_id.tracking != "none" and not line.lot_id:
+                    key = (production.lot_producing_id.name, line.product_id)
+                    line_ids[key].append(line.id)
+                    companies.setdefault(key, production.company_id)
+        if not line_ids:
+            return
+        lot_obj = self.env["stock.production.lot"]
+        lots = {}
+        for lot in lot_obj.search([
+            ("name", "in", list({name for name, product in line_ids})),
+            ("product_id", "in", list(
+                {product.id for name, product in line_ids}))]):
+            lots.setdefault((lot.name, lot.product_id), lot)
+        for name, product in line_ids:
+            if (name, product) not in lots:
+                lots[(name, product)] = lot_obj.action_create_lot(
+                    product, name, companies[(name, product)])
+        for key, ids in line_ids.items():
+            self.env["stock.move.line"].browse(ids).write({
+                "lot_id": lots[key].id})
 
     def button_mark_done(self):
         result = super(MrpProduction, self).button_mark_done()
-        if self.batch_id and self.finished_move_line_ids:
-            for line in self.finished_move_line_ids:
-                line.batch_id = self.batch_id.id
-        if self.finished_move_line_ids:
-            for line in self.finished_move_line_ids:
-                line.write({
-                    "location_id": line.move_id.location_id.id,
-                    "location_dest_id": line.move_id.location_dest_id.id})
-        if result is True and self.quartering:
-            self.action_delete_quartering_line()
-        if self.picking_type_id.chick_production:
-            for line in self.move_line_ids:
-                line.onchange_standard_price()
+        self._update_finished_move_lines()
+        if result is True:
+            self.filtered("quartering").action_delete_quartering_line()
+        self.filtered(
+            lambda c: c.picking_type_id.chick_production).mapped(
+                "move_line_ids")._recompute_standard_price()
         return result
 
+    def _update_finished_move_lines(self):
+        """Put the mother and the move locations on the finished lines,
+        with one write per mother and per pair of locations."""
+        batch_lines = defaultdict(list)
+        location_lines = defaultdict(list)
+        for production in self:
+            for line in production.finished_move_line_ids:
+                if production.batch_id:
+                    batch_lines[production.batch_id.id].append(line.id)
+                if line.move_id:
+                    location_lines[(
+                        line.move_id.location_id.id,
+                        line.move_id.location_dest_id.id)].append(line.id)
+        line_obj = self.env["stock.move.line"]
+        for batch_id, ids in batch_lines.items():
+            line_obj.browse(ids).write({"batch_id": batch_id})
+        for (location_id, location_dest_id), ids in location_lines.items():
+            line_obj.browse(ids).write({
+                "location_id": location_id,
+                "location_dest_id": location_dest_id})
+
     def action_delete_quartering_line(self):
         for line in self:
             if line.quartering:
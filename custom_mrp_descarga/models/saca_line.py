@@ -43,6 +43,30 @@ class SacaLine(models.Model):
             'context': context,
         }
 
+    def _prepare_classification_production_values(self, move_line, bom):
+        self.ensure_one()
+        return {
+            "bom_id": bom.id,
+            "product_id": move_line.product_id.id,
+            "product_uom_id": move_line.product_uom_id.id,
+            "product_qty": move_line.qty_done,
+            "saca_line_id": self.id,
+            "lot_producing_id": move_line.lot_id.id,
+            "company_id": self.company_id.id}
+
+    def _create_classification_productions(self):
+        self.ensure_one()
+        production_obj = self.env["mrp.production"]
+        move_lines = self.move_line_ids.filtered(
+            lambda c: not c.move_id.sale_line_id)
+        boms = production_obj._get_template_boms(
+            move_lines.mapped("product_id.product_tmpl_id"))
+        return production_obj._create_saca_productions([
+            self._prepare_classification_production_values(
+                line, boms.get(
+                    line.product_id.product_tmpl_id, self.env["mrp.bom"]))
+            for line in move_lines])
+
     def action_next_stage(self):
         super(SacaLine, self).action_next_stage()
         stage_clasificado = self.env.ref("custom_descarga.stage_clasificado")
@@ -51,55 +75,27 @@ class SacaLine(models.Model):
             raise ValidationError(
                 _("The company of the saca and your company is not the same."))
         if self.stage_id == stage_clasificado:
-            for line in (
-                self.move_line_ids.filtered(
-                    lambda c: not c.move_id.sale_line_id)):
-                bom = self.env["mrp.bom"].search(
-                    [("product_tmpl_id", "=", (
-                        line.product_id.product_tmpl_id.id))], limit=1)
-                new_production = self.env["mrp.production"].new({
-                    "bom_id": bom.id,
-                    "product_id": line.product_id.id,
-                    "product_uom_id": line.product_uom_id.id,
-                    "product_qty": line.qty_done,
-                    "saca_line_id": self.id,
-                    "lot_producing_id": line.lot_id.id,
-                    "company_id": self.company_id.id
-                    })
-                for (
-                    comp_onchange) in (
-                        new_production._onchange_methods["company_id"]):
-                    comp_onchange(new_production)
-                vals = new_production._convert_to_write(new_production._cache)
-                production = self.env["mrp.production"].create(vals)
-                production.onchange_product_id()
-                production._onchange_product_qty()
-                production._onchange_bom_id()
-                production._onchange_move_raw()
-                production._check_is_deconstruction()
-                production._onchange_location()
-                production._onchange_location_dest()
-                production._onchange_date_planned_start()
-                production._onchange_move_finished_product()
-                production._onchange_move_finished()
-                production._onchange_lot_producing()
-                production._onchange_workorder_ids()
-                production._check_production_lines()
-                production._create_update_move_finished()
-            if self.production_ids:
-                for line in self.production_ids:
-                    if not line.clasified_ids:
-                        self.env["project.task"].create({
-                            "project_id": project.id,
-                            "name": "Clasificado",
-                            "production_id": line.id,
-                            "timesheet_ids": [(0, 0, {
-                                "production_id": line.id,
-                                "date": self.unload_date.date(),
-                                "name": u'{} {}'.format(
-                                    project.name, "Clasificado"),
-                                "project_id": project.id,
-                                "classified": True})]})
-                    for clas in line.clasified_ids:
-                        clas.employee_id = False
-                        clas.user_id = False
+            self._create_classification_productions()
+            productions = self.production_ids
+            self.env["project.task"].create([
+                self._prepare_classification_task_values(production, project)
+                for production in productions.filtered(
+                    lambda c: not c.clasified_ids)])
+            productions.invalidate_cache(["clasified_ids"])
+            productions.mapped("clasified_ids").write({
+                "employee_id": False,
+                "user_id": False})
+
+    def _prepare_classification_task_values(self, production, project):
+        self.ensure_one()
+        return {
+            "project_id": project.id,
+            "name": "Clasificado",
+            "production_id": production.id,
+            "timesheet_ids": [(0, 0, {
+                "production_id": production.id,
+                "date": self.unload_date.date(),
+                "name": u'{} {}'.format(
+                    project.name, "Clasificado"),
+                "project_id": project.id,
+                "classified": True})]}
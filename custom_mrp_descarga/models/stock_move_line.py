@@ -20,24 +20,60 @@ class StockMoveLine(models.Model):
 
     @api.depends("production_id")
     def _compute_sequence(self):
+        """Number the consumed and the finished lines of each production.
+
+        The positions are computed in the database for all the productions
+        at once, the lines not saved yet are numbered from their cache.
+        """
+        lines = self.filtered(lambda c: c.id and c.production_id.id)
+        sequences = lines._get_sequences()
+        for line in self - lines:
+            if not line.production_id:
+                continue
+            production = line.production_id
+            movelines = False
+            if line in production.move_line_ids and (
+                line.location_id == (
+                    production.location_src_id)):
+                movelines = production.move_line_ids
+            elif line in production.finished_move_line_ids:
+                movelines = production.finished_move_line_ids
+            if movelines:
+                sequences[line.id] = movelines.ids.index(line.id) + 1
         for line in self:
-            sequence = 0
-            if line.production_id:
-                ids = []
-                movelines = False
-                if line in line.production_id.move_line_ids and (
-                    line.location_id == (
-                        line.production_id.location_src_id)):
-                    movelines = line.production_id.move_line_ids
-                elif line in line.production_id.finished_move_line_ids:
-                    movelines = line.production_id.finished_move_line_ids
-                if movelines:
-                    for record in movelines:
-                        if record not in ids:
-                            ids.append(record.id)
-                    if line.id in ids:
-                        sequence = ids.index(line.id) + 1
-            line.sequence = sequence
+            line.sequence = sequences.get(line.id, 0)
+
+    def _get_sequences(self):
+        if not self:
+            return {}
+        self.flush(["production_id", "location_id", "location_dest_id"])
+        self.env["mrp.production"].flush([
+            "location_src_id", "production_location_id", "location_dest_id"])
+        self.env.cr.execute("""
+            SELECT id, sequence FROM (
+                SELECT sml.id,
+                    CASE
+                    WHEN sml.location_dest_id = mp.production_location_id
+                        AND sml.location_id = mp.location_src_id
+                    THEN ROW_NUMBER() OVER (
+                        PARTITION BY sml.production_id,
+                            sml.location_dest_id = mp.production_location_id
+                        ORDER BY sml.id)
+                    WHEN sml.location_id = mp.production_location_id
+                        AND sml.location_dest_id = mp.location_dest_id
+                    THEN ROW_NUMBER() OVER (
+                        PARTITION BY sml.production_id,
+                            sml.location_id = mp.production_location_id
+                            AND sml.location_dest_id = mp.location_dest_id
+                        ORDER BY sml.id)
+                    ELSE 0 END AS sequence
+                FROM stock_move_line sml
+                JOIN mrp_production mp ON mp.id = sml.production_id
+                WHERE sml.production_id IN %s
+            ) AS lines
+            WHERE id IN %s
+        """, (tuple(self.mapped("production_id").ids), tuple(self.ids)))
+        return dict(self.env.cr.fetchall())
 
     @api.depends("production_id", "production_id.consume_qty", "qty_done")
     def _compute_performance(self):
@@ -47,6 +83,10 @@ class StockMoveLine(models.Model):
                 line.performance = (
                     line.qty_done * 100) / line.production_id.consume_qty
 
+    def _recompute_standard_price(self):
+        for line in self:
+            line.onchange_standard_price()
+
     @api.onchange("unit")
     def onchange_unit(self):
         super(StockMoveLine, self).onchange_unit()
@@ -97,18 +137,13 @@ class StockMoveLine(models.Model):
         if self.production_id and not (
             self.production_id.quartering) and (
                 self.location_id == self.production_id.location_dest_id):
-            lots = []
             date = fields.Datetime.now()
             date = date - timedelta(days=5)
             date = date.date()
-            lot = self.env["stock.production.lot"].search([
+            result = {"domain": {"lot_id": [
                 ("product_id", "=", self.product_id.id),
                 ("company_id", "=", self.company_id.id),
-                ("create_date", ">=", date)])
-            for line in lot:
-                if line not in lots:
-                    lots.append(line.id)
-            result = {"domain": {"lot_id": [('id', 'in', lots)]}}
+                ("create_date", ">=", fields.Date.to_string(date))]}}
         return result
 
     @api.onchange('lot_id', 'product_id')
@@ -1,6 +1,6 @@
 # Copyright 2022 Berezi Amubieta - AvanzOSC
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
-from odoo import _, api, fields, models
+from odoo import _, api, fields, models, tools
 
 
 class StockProductionLot(models.Model):
@@ -12,6 +12,11 @@ class StockProductionLot(models.Model):
         compute="_compute_average_price",
         store=True)
 
+    def init(self):
+        tools.create_index(
+            self._cr, "stock_production_lot_product_company_date_index",
+            self._table, ["product_id", "company_id", "create_date"])
+
     @api.depends("move_line_ids", "move_line_ids.amount",
                  "move_line_ids.qty_done", "move_line_ids.state")
     def _compute_average_price(self):
@@ -21,3 +21,9 @@ class StockQuant(models.Model):
     is_medicine = fields.Boolean(
         string="Medicine",
         related="location_id.is_medicine", store=True)
+    is_hatchery = fields.Boolean(
+        string="Hatchery",
+        related="location_id.is_hatchery", store=True, index=True)
+    egg = fields.Boolean(
+        string="Egg",
+        related="product_id.egg", store=True, index=True)
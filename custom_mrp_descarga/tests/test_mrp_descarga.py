@@ -0,0 +1,72 @@
+# Copyright 2026 AvanzOSC
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+from odoo.tests import common
+
+
+class TestMrpDescarga(common.SavepointCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        product_obj = cls.env["product.product"]
+        lot_obj = cls.env["stock.production.lot"]
+        quant_obj = cls.env["stock.quant"]
+        cls.company = cls.env.company
+        cls.egg = product_obj.create({
+            "name": "Egg",
+            "type": "product",
+            "tracking": "lot",
+            "egg": True,
+        })
+        cls.chicken = product_obj.create({
+            "name": "Chicken",
+            "type": "product",
+            "tracking": "lot",
+        })
+        cls.hatchery = cls.env["stock.location"].create({
+            "name": "Hatchery",
+            "usage": "internal",
+            "location_id": cls.env.ref("stock.stock_location_stock").id,
+            "is_hatchery": True,
+        })
+        cls.productions = cls.env["mrp.production"]
+        cls.quantities = {}
+        for index, qty in enumerate((10.0, 25.0)):
+            batch = cls.env["stock.picking.batch"].create({
+                "name": "Mother {}".format(index)})
+            lot = lot_obj.create({
+                "name": "EGG-{}".format(index),
+                "product_id": cls.egg.id,
+                "company_id": cls.company.id,
+                "batch_id": batch.id,
+            })
+            quant_obj._update_available_quantity(
+                cls.egg, cls.hatchery, qty, lot_id=lot)
+            production = cls.env["mrp.production"].create({
+                "product_id": cls.chicken.id,
+                "product_uom_id": cls.chicken.uom_id.id,
+                "product_qty": qty,
+                "batch_id": batch.id,
+                "lot_producing_id": lot_obj.create({
+                    "name": "CHICKEN-{}".format(index),
+                    "product_id": cls.chicken.id,
+                    "company_id": cls.company.id,
+                }).id,
+            })
+            cls.productions |= production
+            cls.quantities[production] = (lot, qty)
+
+    def test_reproductor_quants(self):
+        self.productions.invalidate_cache()
+        for production, (lot, qty) in self.quantities.items():
+            self.assertEqual(
+                production.reproductor_quant_ids.mapped("lot_id"), lot)
+
+    def test_emptying_hatchers(self):
+        self.productions.action_emptying_hatchers()
+        for production, (lot, qty) in self.quantities.items():
+            lines = production.move_line_ids.filtered(
+                lambda x: x.product_id == self.egg)
+            self.assertEqual(lines.mapped("lot_id"), lot)
+            self.assertEqual(lines.mapped("location_id"), self.hatchery)
+            self.assertEqual(lines.mapped("batch_id"), production.batch_id)
+            self.assertEqual(sum(lines.mapped("qty_done")), qty)
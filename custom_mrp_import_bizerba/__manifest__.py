@@ -16,6 +16,9 @@
     "data": [
         "security/ir.model.access.csv",
         "data/product_qty_decimal_precision.xml",
+        "data/bizerba_weighing_source.xml",
+        "data/ir_cron.xml",
+        "views/bizerba_weighing_source_view.xml",
         "views/product_template_view.xml",
         "views/mrp_production_view.xml",
         "views/bizerba_import_line_view.xml",
@@ -0,0 +1,20 @@
+# Copyright 2026 AvanzOSC
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+from odoo import http
+from odoo.http import request
+
+
+class BizerbaController(http.Controller):
+
+    @http.route("/bizerba/weighings", type="json", auth="user",
+                methods=["POST"])
+    def post_weighings(self, weighings=None, **kwargs):
+        """Append a batch of weighings to the open classifications.
+
+        ``weighings`` is a list of objects with the fields of the Bizerba
+        import lines, ``line_lot`` selects the classification.
+        """
+        if not isinstance(weighings, list):
+            return {"error": "weighings must be a list"}
+        return request.env["mrp.production"]._ingest_bizerba_weighings(
+            weighings)
@@ -1,3 +1,5 @@
+from . import bizerba_weighing_source
+from . import res_company
 from . import product_template
 from . import bizerba_import_line
 from . import mrp_production
@@ -1,6 +1,8 @@
 # Copyright 2022 Berezi Amubieta - AvanzOSC
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
-from odoo import _, fields, models
+from collections import defaultdict
+
+from odoo import _, api, fields, models
 from odoo.addons import decimal_precision as dp
 
 
@@ -49,6 +51,11 @@ class BizerbaImportLine(models.Model):
         states={"done": [("readonly", True)]},
         copy=False,
     )
+    line_weighing_date = fields.Char(
+        string="Weighing Date",
+        help="Date of the weighing as read from the scale (YYYYMMDD-HHMM).",
+        copy=False,
+    )
     line_product_id = fields.Many2one(
         string="Product",
         comodel_name="product.product",
@@ -67,17 +74,37 @@ class BizerbaImportLine(models.Model):
         copy=False,
         )
 
+    @api.model
+    def _get_bizerba_weighing_key(self, values=None):
+        """Values identifying a weighing of a given minute."""
+        if values is None:
+            self.ensure_one()
+            values = {
+                "line_product_code": self.line_product_code,
+                "line_uom": self.line_uom,
+                "line_product_qty": self.line_product_qty,
+                "line_chicken_code": self.line_chicken_code,
+            }
+        return (
+            values.get("line_product_code") or False,
+            values.get("line_uom") or False,
+            round(values.get("line_product_qty") or 0.0, 6),
+            values.get("line_chicken_code") or False,
+        )
+
     def action_validate(self):
         super().action_validate()
         self.production_id.action_confirm()
         line_values = []
-        for line in self.filtered(lambda l: l.state != "done"):
+        lines = self.filtered(lambda l: l.state != "done")
+        cache = lines._get_resolution_cache()
+        for line in lines:
             log_info = ""
             product = uom = False
-            product, log_info_product = line._check_product()
+            product, log_info_product = line._check_product(cache)
             if log_info_product:
                 log_info += log_info_product
-            uom, log_info_uom = line._check_uom()
+            uom, log_info_uom = line._check_uom(cache)
             if log_info_uom:
                 log_info += log_info_uom
             state = "error" if log_info else "pass"
@@ -103,56 +130,106 @@ class BizerbaImportLine(models.Model):
     def action_process(self):
         super().action_validate()
         line_values = []
-        products = []
-        for line in self.filtered(lambda l: l.state not in ("error", "done")):
-            log_info = ""
-            if line.action == "create" and (
-                line.line_product_id) not in (
-                    products):
-                move_line = line.production_id.move_line_ids.filtered(
-                    lambda c: c.product_id == line.line_product_id)
-                if move_line:
-                    products.append(line.line_product_id)
-                    same_product_lines = self.filtered(
-                        lambda c: c.state not in ("error", "done") and (
-                            c.action == "create") and (
-                                c.line_product_id == line.line_product_id))
-                    container = len(same_product_lines)
-                    qty_done = sum(
-                        same_product_lines.mapped("line_product_qty"))
-                    move_line[:1].write({
-                        "container": container,
-                        "qty_done": qty_done,
-                        "product_uom_id": line.line_uom_id.id})
-                    move_line[:1].onchange_container()
-                    move_line[:1].onchange_unit()
-                else:
-                    log_info = (
-                        _("Error: There is no entry line " +
-                          "with this product."))
-            if log_info:
-                line.write({
-                    "log_info": log_info,
-                    "state": "error",
-                    "action": "nothing"})
-            else:
-                line.write({
-                    "state": "done",
-                    "action": "nothing"})
+        lines = self.filtered(lambda l: l.state not in ("error", "done"))
+        move_lines = {}
+        for move_line in lines.mapped("production_id.move_line_ids"):
+            move_lines.setdefault(
+                (move_line.production_id.id, move_line.product_id.id),
+                move_line)
+        product_lines = {}
+        for line in lines.filtered(lambda l: l.action == "create"):
+            key = (line.production_id.id, line.line_product_id.id)
+            if key not in product_lines:
+                product_lines[key] = [line, [], 0.0]
+            product_lines[key][1].append(line.id)
+            product_lines[key][2] += line.line_product_qty
+        done_totals = lines._get_done_totals()
+        error_line_ids = []
+        for key, (line, line_ids, qty_done) in product_lines.items():
+            move_line = move_lines.get(key)
+            if not move_line:
+                error_line_ids.extend(line_ids)
+                continue
+            done_count, done_qty = done_totals.get(key, (0, 0.0))
+            move_line.write({
+                "container": done_count + len(line_ids),
+                "qty_done": done_qty + qty_done,
+                "product_uom_id": line.line_uom_id.id})
+            move_line.onchange_container()
+            move_line.onchange_unit()
+        error_lines = self.browse(error_line_ids)
+        if error_lines:
+            error_lines.write({
+                "log_info": _("Error: There is no entry line " +
+                              "with this product."),
+                "state": "error",
+                "action": "nothing"})
+        (lines - error_lines).write({
+            "state": "done",
+            "action": "nothing"})
         return line_values
 
-    def _check_product(self):
+    def _get_done_totals(self):
+        """Weighings already processed per production and product.
+
+        Lines appended after a previous process are added to them, so the
+        move lines always hold the total of the classification.
+        """
+        if not self:
+            return {}
+        groups = self.read_group(
+            [("production_id", "in", self.mapped("production_id").ids),
+             ("state", "=", "done")],
+            ["line_product_qty"], ["production_id", "line_product_id"],
+            lazy=False)
+        return {
+            (group["production_id"][0], group["line_product_id"][0]): (
+                group["__count"], group["line_product_qty"])
+            for group in groups
+            if group["production_id"] and group["line_product_id"]}
+
+    def _get_bizerba_code(self):
+        self.ensure_one()
+        return self.line_product_code or self.line_chicken_code
+
+    def _get_resolution_cache(self):
+        """Resolve the Bizerba codes and UoM names of the lines at once.
+
+        Returns the products by Bizerba code, the UoMs by lowercase name and
+        the products of the move lines of each production.
+        """
+        codes = {
+            line._get_bizerba_code() for line in self
+            if not line.line_product_id}
+        codes.discard(False)
+        products = defaultdict(lambda: self.env["product.product"])
+        if codes:
+            for product in self.env["product.product"].search(
+                    [("bizerba_code", "in", list(codes))]):
+                products[product.bizerba_code] |= product
+        uoms = defaultdict(lambda: self.env["uom.uom"])
+        if self.filtered(lambda l: not l.line_uom_id):
+            for uom in self.env["uom.uom"].search([]):
+                uoms[uom.name.lower()] |= uom
+        move_products = defaultdict(set)
+        for move_line in self.mapped("production_id.move_line_ids"):
+            move_products[move_line.production_id.id].add(
+                move_line.product_id.id)
+        return {
+            "products": products,
+            "uoms": uoms,
+            "move_products": move_products,
+        }
+
+    def _check_product(self, cache=None):
         self.ensure_one()
         log_info = ""
         if self.line_product_id:
             return self.line_product_id, log_info
-        product_obj = self.env["product.product"]
-        if self.line_product_code:
-            code = self.line_product_code
-        else:
-            code = self.line_chicken_code
-        search_domain = [("bizerba_code", "=", code)]
-        products = product_obj.search(search_domain)
+        if cache is None:
+            cache = self._get_resolution_cache()
+        code = self._get_bizerba_code()
+        products = cache["products"].get(code)
         if not products:
             products = False
             log_info = _("Error: No product found.")
@@ -162,21 +239,20 @@ class BizerbaImportLine(models.Model):
                 "Error: More than one product with Bizerba code {} found."
                 ).format(code)
         elif len(products) == 1:
-            if not self.production_id.move_line_ids.filtered(
-                lambda c: c.product_id == products
-                ):
+            if products.id not in cache["move_products"][
+                    self.production_id.id]:
                 log_info = (_("Error: There is no entry line " +
                               "with this product."))
         return products and products[:1], log_info
 
-    def _check_uom(self):
+    def _check_uom(self, cache=None):
         self.ensure_one()
         log_info = ""
         if self.line_uom_id:
             return self.line_uom_id, log_info
-        uom_obj = self.env["uom.uom"]
-        search_domain = [("name", "=ilike", self.line_uom)]
-        uoms = uom_obj.search(search_domain)
+        if cache is None:
+            cache = self._get_resolution_cache()
+        uoms = cache["uoms"].get((self.line_uom or "").lower())
         if not uoms:
             uoms = False
             log_info = _("Error: No UoM found.")
@@ -0,0 +1,198 @@
+# Copyright 2026 AvanzOSC
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+import csv
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from odoo import _, fields, models
+from odoo.exceptions import ValidationError
+
+try:
+    import pymssql
+except ImportError:
+    pymssql = None
+
+WEIGHING_TABLE = "[Pesada Individual]"
+WEIGHING_DATE_FORMAT = "%Y%m%d-%H%M"
+# Positions of lot, product code, quantity, chicken code and date columns
+WEIGHING_COLUMNS = (8, 9, 10, 12, 13)
+
+
+class ConnectionPool(object):
+    """Keep idle connections to reuse them between weighing fetches."""
+
+    def __init__(self, connect, size):
+        self.connect = connect
+        self.size = size
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def _acquire(self):
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return self.connect()
+                conn = self.idle.pop()
+            try:
+                conn.cursor().execute("SELECT 1")
+                return conn
+            except Exception:
+                conn.close()
+
+    def _release(self, conn):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            # Also when the reading generator is closed before its end, the
+            # connection may still have pending results
+            conn.close()
+            raise
+        self._release(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def query_weighings(cursor, empty_query, placeholder, lot_name, date_from,
+                    date_to, batch_size=1000):
+    """Yield (lot, product code, quantity, chicken code, date) rows.
+
+    GT1F holds the weighing date as 'YYYYMMDD-HHMM', so comparing it with
+    dates in the same format filters the date range on the server. The
+    columns are addressed by position, so their names are read first.
+    """
+    cursor.execute(empty_query.format(WEIGHING_TABLE))
+    columns = [
+        "[{}]".format(column[0].replace("]", "]]"))
+        for column in cursor.description]
+    lot, code, qty, chicken, date = [
+        columns[position] for position in WEIGHING_COLUMNS]
+    query = (
+        "SELECT {lot}, {code}, {qty}, {chicken}, {date} FROM {table} "
+        "WHERE {lot} = {placeholder} AND GT1F BETWEEN {placeholder} "
+        "AND {placeholder}").format(
+            lot=lot, code=code, qty=qty, chicken=chicken, date=date,
+            table=WEIGHING_TABLE, placeholder=placeholder)
+    cursor.execute(query, (lot_name, date_from, date_to))
+    rows = cursor.fetchmany(batch_size)
+    while rows:
+        for row in rows:
+            yield tuple(row)
+        rows = cursor.fetchmany(batch_size)
+
+
+class BizerbaWeighingSource(models.Model):
+    _name = "bizerba.weighing.source"
+    _description = "Bizerba weighing source"
+
+    name = fields.Char(
+        string="Name",
+        required=True)
+    active = fields.Boolean(
+        string="Active",
+        default=True)
+    company_id = fields.Many2one(
+        string="Company",
+        comodel_name="res.company",
+        default=lambda self: self.env.company)
+    source_type = fields.Selection(
+        string="Type",
+        selection=[
+            ("mssql", "SQL Server"),
+            ("sqlite", "SQLite File"),
+            ("csv", "CSV File"),
+        ],
+        default="mssql",
+        required=True)
+    server = fields.Char(
+        string="Server")
+    database = fields.Char(
+        string="Database")
+    user = fields.Char(
+        string="User",
+        groups="mrp.group_mrp_manager")
+    password = fields.Char(
+        string="Password",
+        groups="mrp.group_mrp_manager")
+    pool_size = fields.Integer(
+        string="Pool Size",
+        default=4,
+        help="Idle SQL Server connections kept to be reused.")
+    file_path = fields.Char(
+        string="File Path",
+        help="SQLite database with a 'Pesada Individual' table, or CSV file "
+        "with the same columns, header included.")
+
+    def _is_configured(self):
+        self.ensure_one()
+        source = self.sudo()
+        if source.source_type == "mssql":
+            return bool(source.server and source.database and source.user)
+        return bool(source.file_path)
+
+    def _fetch_weighings(self, lot_name, start_date, stop_date, since=None):
+        """Yield the (lot, product code, quantity, chicken code, date)
+        weighings of the lot between both dates.
+
+        ``since`` is a weighing date as read from the scale, when given only
+        the weighings of that minute or later are read.
+        """
+        self.ensure_one()
+        date_from = start_date.strftime(WEIGHING_DATE_FORMAT)
+        if since and since > date_from:
+            date_from = since
+        source = self.sudo()
+        return getattr(source, "_fetch_{}_weighings".format(self.source_type))(
+            str(lot_name), date_from,
+            stop_date.strftime(WEIGHING_DATE_FORMAT))
+
+    def _get_mssql_pool(self):
+        self.ensure_one()
+        if pymssql is None:
+            raise ValidationError(_("The pymssql library is not installed."))
+        key = (self.server, self.database, self.user, self.password)
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(
+                    lambda: pymssql.connect(
+                        server=key[0], database=key[1], user=key[2],
+                        password=key[3]),
+                    self.pool_size)
+            return _pools[key]
+
+    def _fetch_mssql_weighings(self, lot_name, date_from, date_to):
+        with self._get_mssql_pool().connection() as conn:
+            for row in query_weighings(
+                    conn.cursor(), "SELECT TOP 0 * FROM {}", "%s", lot_name,
+                    date_from, date_to):
+                yield row
+
+    def _fetch_sqlite_weighings(self, lot_name, date_from, date_to):
+        conn = sqlite3.connect(self.file_path)
+        try:
+            for row in query_weighings(
+                    conn.cursor(), "SELECT * FROM {} LIMIT 0", "?", lot_name,
+                    date_from, date_to):
+                yield row
+        finally:
+            conn.close()
+
+    def _fetch_csv_weighings(self, lot_name, date_from, date_to):
+        with open(self.file_path, newline="", encoding="utf-8-sig") as file:
+            reader = csv.reader(file)
+            date_position = next(reader).index("GT1F")
+            for row in reader:
+                if row[WEIGHING_COLUMNS[0]] == lot_name and (
+                        date_from <= row[date_position] <= date_to):
+                    yield tuple(row[position] for position in WEIGHING_COLUMNS)
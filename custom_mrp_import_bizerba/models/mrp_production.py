@@ -3,9 +3,22 @@
 from odoo import _, api, fields, models
 from odoo.addons.base_import_wizard.models.base_import import IMPORT_STATUS
 from odoo.exceptions import ValidationError
+from collections import Counter
 from datetime import datetime, timedelta, time
+import logging
 import pytz
-import pymssql
+
+_logger = logging.getLogger(__name__)
+
+BIZERBA_WEIGHING_FIELDS = (
+    "line_lot",
+    "line_product_code",
+    "line_product_qty",
+    "line_uom",
+    "line_chicken_code",
+    "line_date",
+    "line_weighing_date",
+)
 
 
 class MrpProduction(models.Model):
@@ -29,6 +42,16 @@ class MrpProduction(models.Model):
         string="Import Status",
         store=True,
     )
+    bizerba_last_weighing = fields.Char(
+        string="Last Bizerba Weighing",
+        copy=False,
+        help="Date (YYYYMMDD-HHMM) of the last weighing read from the scale, "
+        "the next synchronization only reads weighings from this date.")
+    bizerba_pushed = fields.Boolean(
+        string="Weighings Sent By The Scale",
+        copy=False,
+        help="The scale sends the weighings of this classification, so the "
+        "scheduled synchronization does not read them.")
 
     @api.depends(
         "import_line_ids",
@@ -42,7 +65,8 @@ class MrpProduction(models.Model):
                 production.import_state = "error"
             elif line_states and all([state == "done" for state in line_states]):
                 production.import_state = "done"
-            elif line_states and all([state == "pass" for state in line_states]):
+            elif line_states and all(
+                    [state in ("pass", "done") for state in line_states]):
                 production.import_state = "pass"
             elif lines:
                 production.import_state = "2validate"
@@ -53,6 +77,18 @@ class MrpProduction(models.Model):
         self.ensure_one()
         self.import_line_ids.unlink()
         self.action_confirm()
+        self.write({
+            "bizerba_last_weighing": False,
+            "bizerba_pushed": False,
+        })
+        self._sync_bizerba_weighings()
+
+    def action_sync_bizerba(self):
+        for production in self:
+            production._sync_bizerba_weighings()
+
+    def _check_bizerba_classification(self):
+        self.ensure_one()
         if not self.clasified_date or not (
             self.clasified_time_start) and not (
                 self.clasified_time_stop):
@@ -62,6 +98,71 @@ class MrpProduction(models.Model):
         if not self.lot_producing_id:
             raise ValidationError(_(
                 "This classification does not have the lot."))
+        source = self.company_id.bizerba_source_id
+        if not source or not source._is_configured():
+            raise ValidationError(_(
+                "The company of this classification does not have a "
+                "configured Bizerba weighing source."))
+        return source
+
+    def _sync_bizerba_weighings(self):
+        """Append the weighings newer than the last one already read.
+
+        The weighings of the last read minute are read again, and the ones
+        already imported are skipped by comparing their values.
+        """
+        self.ensure_one()
+        source = self._check_bizerba_classification()
+        start_date, stop_date = self._get_bizerba_date_range()
+        since = self.bizerba_last_weighing
+        try:
+            rows = list(source._fetch_weighings(
+                self.lot_producing_id.name, start_date, stop_date,
+                since=since))
+        except Exception:
+            raise ValidationError(_(
+                "The connection could not be established."))
+        imported = Counter(
+            line._get_bizerba_weighing_key()
+            for line in self.import_line_ids.filtered(
+                lambda x: since and x.line_weighing_date == since))
+        lines_data = []
+        for row in rows:
+            line_data = self._prepare_bizerba_line_values(row)
+            key = self.env["bizerba.import.line"]._get_bizerba_weighing_key(
+                line_data)
+            if imported[key] > 0:
+                imported[key] -= 1
+                continue
+            lines_data.append(line_data)
+        if rows:
+            self.bizerba_last_weighing = max(row[4] for row in rows)
+        if lines_data:
+            self.env["bizerba.import.line"].create(lines_data)
+            self.action_validate()
+
+    def _cron_sync_bizerba(self):
+        productions = self.search([
+            ("saca_line_id", "!=", False),
+            ("lot_producing_id", "!=", False),
+            ("company_id.bizerba_source_id", "!=", False),
+            ("bizerba_pushed", "=", False),
+            ("state", "in", ("confirmed", "progress", "to_close"))])
+        yesterday = fields.Date.context_today(self) - timedelta(days=1)
+        for production in productions.filtered(
+                lambda p: p.clasified_date and p.clasified_date >= yesterday
+                and p.company_id.bizerba_source_id._is_configured()):
+            production = production.with_context(
+                tz=production.user_id.tz or self.env.user.tz)
+            try:
+                with self.env.cr.savepoint():
+                    production._sync_bizerba_weighings()
+            except Exception:
+                _logger.exception(
+                    "Bizerba synchronization of %s failed", production.name)
+
+    def _get_bizerba_date_range(self):
+        self.ensure_one()
         date = self.clasified_date
         time_start = self.clasified_time_start
         if time_start == 0:
@@ -73,55 +174,161 @@ class MrpProduction(models.Model):
         time_stop = self.clasified_time_stop
         time_stop = "{0:02.0f}:{1:02.0f}".format(*divmod(time_stop * 60, 60))
         time_stop = datetime.strptime(time_stop, "%H:%M").time()
-        start_date = "{} {}".format(date, time_start)
-        start_date = datetime.strptime(start_date, "%Y-%m-%d %H:%M:%S")
+        start_date = datetime.combine(date, time_start)
         if time_start > time_stop:
             date = date + timedelta(days=1)
-        stop_date = "{} {}".format(date, time_stop)
-        stop_date = datetime.strptime(stop_date, "%Y-%m-%d %H:%M:%S")
+        stop_date = datetime.combine(date, time_stop)
+        return start_date, stop_date
+
+    def _prepare_bizerba_line_values(self, row):
+        self.ensure_one()
+        line_lot, line_product_code, line_product_qty, line_chicken_code, (
+            line_date) = row
+        line_product_qty = line_product_qty.split(";")
+        line_uom = line_product_qty[0]
+        line_product_qty = float(line_product_qty[2]) * pow(
+            10, float(line_product_qty[1]))
+        return {
+            "import_id": self.id,
+            "production_id": self.id,
+            "line_lot": line_lot,
+            "line_product_code": line_product_code,
+            "line_product_qty": line_product_qty,
+            "line_uom": line_uom,
+            "line_chicken_code": line_chicken_code,
+            "line_date": self._get_bizerba_line_date(line_date),
+            "line_weighing_date": line_date,
+            "log_info": "",
+            }
+
+    def _get_bizerba_line_date(self, weighing_date):
+        """UTC datetime of a weighing date read from the scale."""
+        line_date = datetime.strptime(weighing_date, "%Y%m%d-%H%M")
+        timezone = pytz.timezone(self._context.get('tz') or 'UTC')
+        line_date = timezone.localize(line_date).astimezone(pytz.UTC)
+        return line_date.replace(tzinfo=None)
+
+    @api.model
+    def _get_bizerba_open_productions(self, lots):
+        """Open classifications by lot name, the latest one if several."""
+        productions = self.search([
+            ("saca_line_id", "!=", False),
+            ("lot_producing_id.name", "in", list(lots)),
+            ("state", "in", ("confirmed", "progress", "to_close"))],
+            order="id desc")
+        result = {}
+        for production in productions:
+            result.setdefault(production.lot_producing_id.name, production)
+        return result
+
+    @api.model
+    def _check_bizerba_weighing(self, weighing):
+        """Return the import line values of a weighing sent by the scale, or
+        the reason to reject it."""
+        if not isinstance(weighing, dict):
+            return {}, _("The weighing must be an object.")
+        values = {
+            key: weighing[key] for key in BIZERBA_WEIGHING_FIELDS
+            if key in weighing}
+        if not values.get("line_lot"):
+            return values, _("The weighing does not have the lot.")
+        values["line_lot"] = str(values["line_lot"])
+        if not (values.get("line_product_code") or (
+                values.get("line_chicken_code"))):
+            return values, _("The weighing does not have the product code.")
         try:
-            conn = pymssql.connect(
-                server='192.168.201.3\SQLEXPRESS',
-                user='integracion',
-                password='ew#211218',
-                database='BCT2DB')
-            cursor = conn.cursor()
-            query = "SELECT * FROM [Pesada Individual] as p WHERE LEFT(p.GT1F,4)+'-'+SUBSTRING(p.GT1F,5,2)+'-'+SUBSTRING(p.GT1F,7,2)+' '+SUBSTRING(p.GT1F,10,2)+':'+RIGHT(p.GT1F,2)+':00' BETWEEN '" +str(start_date)+"' AND '"+str(stop_date)+"'"
-            cursor.execute(query)
-            row = cursor.fetchone()
-            while row:
-                if str(self.lot_producing_id.name) == str(row[8]):
-                    line_lot = row[8]
-                    line_product_code = row[9]
-                    line_product_qty = row[10]
-                    line_product_qty = line_product_qty.split(";")
-                    line_uom = line_product_qty[0]
-                    line_product_qty = float(line_product_qty[2]) * pow(
-                        10, float(line_product_qty[1]))
-                    line_chicken_code = row[12]
-                    line_date = row[13]
-                    line_date = datetime.strptime(line_date, "%Y%m%d-%H%M")
-                    log_info = ""
-                    timezone = pytz.timezone(self._context.get('tz') or 'UTC')
-                    line_date = timezone.localize(
-                        line_date).astimezone(pytz.UTC)
-                    line_date = line_date.replace(tzinfo=None)
-                    line_data = ({
-                        "import_id": self.id,
-                        "production_id": self.id,
-                        "line_lot": line_lot,
-                        "line_product_code": line_product_code,
-                        "line_product_qty": line_product_qty,
-                        "line_uom": line_uom,
-                        "line_chicken_code": line_chicken_code,
-                        "line_date": line_date,
-                        "log_info": log_info,
-                        })
-                    self.import_line_ids = [(0, 0, line_data)]
-                row = cursor.fetchone()
-            conn.close()
-            if self.import_line_ids:
-                self.action_validate()
-        except Exception:
-            raise ValidationError(_(
-                "The connection could not be established."))
+            values["line_product_qty"] = float(
+                values.get("line_product_qty") or 0.0)
+        except (TypeError, ValueError):
+            return values, _("Wrong quantity {}.").format(
+                values["line_product_qty"])
+        if not (values.get("line_date") or values.get("line_weighing_date")):
+            return values, _("The weighing does not have the date.")
+        if values.get("line_date"):
+            try:
+                values["line_date"] = fields.Datetime.to_datetime(
+                    values["line_date"])
+            except (TypeError, ValueError):
+                return values, _("Wrong date {}.").format(values["line_date"])
+        if values.get("line_weighing_date"):
+            values["line_weighing_date"] = str(values["line_weighing_date"])
+            try:
+                datetime.strptime(values["line_weighing_date"], "%Y%m%d-%H%M")
+            except ValueError:
+                return values, _("Wrong weighing date {}.").format(
+                    values["line_weighing_date"])
+        return values, False
+
+    def _get_bizerba_weighing_date(self, line_date):
+        """Weighing date as read from the scale of a UTC datetime."""
+        timezone = pytz.timezone(self._context.get('tz') or 'UTC')
+        line_date = pytz.UTC.localize(line_date).astimezone(timezone)
+        return line_date.strftime("%Y%m%d-%H%M")
+
+    @api.model
+    def _ingest_bizerba_weighings(self, weighings):
+        """Append weighings sent by the scale to their open classification.
+
+        Each weighing is a dict with the fields of the Bizerba import lines,
+        the line date and the scale weighing date are deduced from each
+        other. The new lines are validated and processed at once, so the
+        move lines of the classifications are kept up to date.
+
+        The classifications remember their last weighing and are left out of
+        the scheduled synchronization, which would read the same weighings
+        from the scale database again.
+        """
+        rejected = []
+        valid = []
+        for index, weighing in enumerate(weighings):
+            values, error = self._check_bizerba_weighing(weighing)
+            if error:
+                rejected.append({"index": index, "error": error})
+                continue
+            valid.append((index, values))
+        productions = self._get_bizerba_open_productions(
+            {values["line_lot"] for index, values in valid})
+        lines_data = []
+        last_weighings = {}
+        for index, values in valid:
+            production = productions.get(values["line_lot"])
+            if not production:
+                rejected.append({
+                    "index": index,
+                    "error": _(
+                        "There is no open classification with the lot {}."
+                    ).format(values["line_lot"]),
+                })
+                continue
+            production = production.with_context(
+                tz=production.user_id.tz or self.env.user.tz)
+            if not values.get("line_date"):
+                values["line_date"] = production._get_bizerba_line_date(
+                    values["line_weighing_date"])
+            elif not values.get("line_weighing_date"):
+                values["line_weighing_date"] = (
+                    production._get_bizerba_weighing_date(values["line_date"]))
+            values.update({
+                "import_id": production.id,
+                "production_id": production.id,
+                "log_info": "",
+            })
+            lines_data.append(values)
+            last_weighings[production] = max(
+                last_weighings.get(production, ""),
+                values["line_weighing_date"])
+        lines = self.env["bizerba.import.line"].create(lines_data)
+        for production, last_weighing in last_weighings.items():
+            production.write({
+                "bizerba_last_weighing": max(
+                    production.bizerba_last_weighing or "", last_weighing),
+                "bizerba_pushed": True,
+            })
+        if lines:
+            lines.mapped("production_id").action_validate()
+            lines.filtered(lambda x: x.state == "pass").action_process()
+        return {
+            "created": len(lines),
+            "error": len(lines.filtered(lambda x: x.state == "error")),
+            "rejected": sorted(rejected, key=lambda r: r["index"]),
+        }
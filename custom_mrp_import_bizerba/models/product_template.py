@@ -7,4 +7,9 @@ from odoo import fields, models
 class ProductTemplate(models.Model):
     _inherit = "product.template"
 
-    bizerba_code = fields.Char(string="Bizerba Code")
+    bizerba_code = fields.Char(string="Bizerba Code", index=True, copy=False)
+
+    _sql_constraints = [
+        ("bizerba_code_unique", "unique(bizerba_code)",
+         "The Bizerba code must be unique."),
+    ]
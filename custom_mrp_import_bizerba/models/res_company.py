@@ -0,0 +1,12 @@
+# Copyright 2026 AvanzOSC
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import fields, models
+
+
+class ResCompany(models.Model):
+    _inherit = "res.company"
+
+    bizerba_source_id = fields.Many2one(
+        string="Bizerba Weighing Source",
+        comodel_name="bizerba.weighing.source")
@@ -15,8 +15,10 @@
     ],
     "data": [
         "security/ir.model.access.csv",
+        "data/ir_cron.xml",
         "views/mrp_bom_import_view.xml",
         "views/mrp_bom_import_line_view.xml",
+        "views/mrp_bom_import_job_view.xml",
         "views/mrp_bom_line_view.xml",
         "views/product_view.xml",
     ],
@@ -1,2 +1,3 @@
 from . import mrp_bom_import
+from . import mrp_bom_import_job
 from . import product
@@ -2,12 +2,21 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
 import base64
+import csv
+import io
+import logging
+import re
+from collections import Counter, defaultdict
+from itertools import islice
 
 from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
 from odoo.models import expression
+from odoo.tools import split_every
 from odoo.tools.safe_eval import safe_eval
 
+_logger = logging.getLogger(__name__)
+
 try:
     import xlrd
 
@@ -18,6 +27,11 @@ try:
 except ImportError:
     xlrd = xlsx = None
 
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
 
 def check_number(number):
     try:
@@ -43,6 +57,47 @@ def convert2str(value):
         return value.strip(" \n\t")
 
 
+NUMBER_RE = re.compile(r"^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$")
+
+
+def normalize_numbers(values):
+    """Column-wise ``check_number``: return the converted values and the
+    positions of the values that are not numbers. Empty cells are 0."""
+    numbers = []
+    errors = []
+    for position, value in enumerate(values):
+        if isinstance(value, (float, int)):
+            numbers.append(value)
+        elif value is None or value == "":
+            numbers.append(0.0)
+        elif isinstance(value, str) and NUMBER_RE.match(value):
+            value = value.strip()
+            numbers.append(int(value) if value.isdigit() else float(value))
+        else:
+            numbers.append(False)
+            errors.append(position)
+    return numbers, errors
+
+
+def normalize_strings(values):
+    """Column-wise ``convert2str``, empty cells are empty strings."""
+    strings = []
+    for value in values:
+        if value is None:
+            value = ""
+        elif not isinstance(value, (str, tuple)):
+            value = str(value).split(".")[0]
+        elif isinstance(value, tuple):
+            value = value[0]
+        strings.append(value.strip(" \n\t"))
+    return strings, []
+
+
+COLUMN_NORMALIZERS = {
+    "number": normalize_numbers,
+    "text": normalize_strings,
+}
+
 IMPORT_STATUS = [
     ("2validate", "To validate"),
     ("pass", "Validated"),
@@ -50,6 +105,13 @@ IMPORT_STATUS = [
     ("done", "Processed"),
 ]
 
+LINE_COUNT_FIELDS = {
+    state: "line_{}_count".format(state) for state, state_name in IMPORT_STATUS
+}
+COUNTER_FIELDS = ["line_count", "log_count", "bom_count"] + list(
+    LINE_COUNT_FIELDS.values()
+)
+
 
 class MrpBomImport(models.Model):
     _name = "mrp.bom.import"
@@ -63,8 +125,39 @@ class MrpBomImport(models.Model):
         copy=False,
     )
     bom_count = fields.Integer(
-        compute="_compute_bom_count",
+        compute="_compute_line_counters",
         string="Total BoMs",
+        store=True,
+    )
+    line_count = fields.Integer(
+        compute="_compute_line_counters",
+        string="Lines",
+        store=True,
+    )
+    line_2validate_count = fields.Integer(
+        compute="_compute_line_counters",
+        string="Lines To Validate",
+        store=True,
+    )
+    line_pass_count = fields.Integer(
+        compute="_compute_line_counters",
+        string="Validated Lines",
+        store=True,
+    )
+    line_error_count = fields.Integer(
+        compute="_compute_line_counters",
+        string="Error Lines",
+        store=True,
+    )
+    line_done_count = fields.Integer(
+        compute="_compute_line_counters",
+        string="Processed Lines",
+        store=True,
+    )
+    log_count = fields.Integer(
+        compute="_compute_line_counters",
+        string="Logged Lines",
+        store=True,
     )
     data = fields.Binary(
         string="File",
@@ -91,14 +184,68 @@ class MrpBomImport(models.Model):
         selection=IMPORT_STATUS,
         compute="_compute_state",
         string="Status",
+        store=True,
     )
-    log_info = fields.Text(
-        string="Log Info",
-        compute="_compute_log_info",
+    log_line_ids = fields.One2many(
+        comodel_name="mrp.bom.line.import",
+        inverse_name="bom_import_id",
+        string="Log",
+        domain=[("log_info", "not in", [False, ""])],
+        readonly=True,
     )
     product_found_by_code = fields.Boolean(
         string="Product Found By Code",
         default=False)
+    column_error_info = fields.Text(
+        string="Column Errors",
+        readonly=True,
+        copy=False,
+    )
+    multi_level = fields.Boolean(
+        string="Multi-level BoMs",
+        help="Components that are also parents in the same file get their "
+        "BoMs created first, and cycles in the structure are reported.",
+    )
+    upsert = fields.Boolean(
+        string="Update Existing BoMs",
+        help="Parents that already have a BoM with the same reference get "
+        "only their changed components updated instead of a new BoM. Once "
+        "every line is processed, the BoMs of a previous import of this "
+        "record that are no longer in the file are archived.",
+    )
+    previous_bom_ids = fields.Many2many(
+        comodel_name="mrp.bom",
+        string="Previously Imported BoMs",
+        copy=False,
+    )
+    bom_created_count = fields.Integer(string="Created BoMs", copy=False)
+    bom_updated_count = fields.Integer(string="Updated BoMs", copy=False)
+    bom_unchanged_count = fields.Integer(string="Unchanged BoMs", copy=False)
+    bom_archived_count = fields.Integer(string="Archived BoMs", copy=False)
+    import_chunk_size = fields.Integer(
+        string="Import Chunk Size",
+        default=1000,
+        help="Number of file rows read and created together while importing.",
+    )
+    imported_row_count = fields.Integer(
+        string="Imported Rows",
+        readonly=True,
+        copy=False,
+        help="Number of file rows read by the last import. The import runs in "
+        "a single transaction, its progress is only written in the server log.",
+    )
+    job_batch_size = fields.Integer(
+        string="Background Batch Size",
+        default=500,
+        help="Number of lines validated or processed and committed together "
+        "by background jobs.",
+    )
+    job_ids = fields.One2many(
+        comodel_name="mrp.bom.import.job",
+        inverse_name="bom_import_id",
+        string="Background Jobs",
+        copy=False,
+    )
 
     def _get_import_lines(self):
         return self.mapped("bom_line_import_ids")
@@ -110,46 +257,102 @@ class MrpBomImport(models.Model):
                 file_import.filename, file_import.file_date
             )
 
-    @api.depends(
-        "bom_line_import_ids",
-        "bom_line_import_ids.product_id",
-        "bom_line_import_ids.bom_id",
-    )
-    def _compute_bom_count(self):
+    @api.depends()
+    def _compute_line_counters(self):
+        """Count the lines of the imports from scratch.
+
+        Only used to initialize the counters, afterwards they are kept up to
+        date by the import lines themselves, see
+        ``mrp.bom.line.import._update_import_counters``.
+        """
+        counters = {
+            bom_import.id: dict.fromkeys(COUNTER_FIELDS, 0) for bom_import in self
+        }
+        import_ids = tuple(import_id for import_id in self.ids if import_id)
+        if import_ids:
+            line_obj = self.env["mrp.bom.line.import"]
+            domain = [("bom_import_id", "in", import_ids)]
+            for group in line_obj.read_group(
+                domain, ["bom_import_id", "state"], ["bom_import_id", "state"],
+                lazy=False,
+            ):
+                import_counters = counters[group["bom_import_id"][0]]
+                import_counters["line_count"] += group["__count"]
+                if group["state"] in LINE_COUNT_FIELDS:
+                    import_counters[LINE_COUNT_FIELDS[group["state"]]] += group[
+                        "__count"
+                    ]
+            for group in line_obj.read_group(
+                expression.AND([domain, [("log_info", "not in", [False, ""])]]),
+                ["bom_import_id"],
+                ["bom_import_id"],
+            ):
+                counters[group["bom_import_id"][0]]["log_count"] = group[
+                    "bom_import_id_count"
+                ]
+            self.env.cr.execute(
+                """
+                SELECT bom_import_id, COUNT(DISTINCT bom_id)
+                FROM mrp_bom_line_import
+                WHERE bom_import_id IN %s
+                GROUP BY bom_import_id
+                """,
+                (import_ids,),
+            )
+            for import_id, bom_count in self.env.cr.fetchall():
+                counters[import_id]["bom_count"] = bom_count
         for bom_import in self:
-            lines = bom_import._get_import_lines()
-            bom_import.bom_count = len(lines.mapped("bom_id"))
+            bom_import.update(counters[bom_import.id])
+
+    def _apply_line_counter_deltas(self, deltas):
+        """Add ``deltas`` ({import id: {counter: delta}}) to the counters.
+
+        The increments are done in SQL so that concurrent line writes on the
+        same import do not overwrite each other.
+        """
+        bom_imports = self.browse(list(deltas))
+        self.flush(COUNTER_FIELDS, bom_imports)
+        for import_id, import_deltas in deltas.items():
+            import_deltas = {
+                field_name: delta
+                for field_name, delta in import_deltas.items()
+                if delta
+            }
+            if not import_deltas:
+                continue
+            self.env.cr.execute(
+                "UPDATE mrp_bom_import SET {} WHERE id = %s".format(
+                    ", ".join(
+                        "{0} = {0} + %s".format(field_name)
+                        for field_name in import_deltas
+                    )
+                ),
+                list(import_deltas.values()) + [import_id],
+            )
+        bom_imports.invalidate_cache(COUNTER_FIELDS)
+        bom_imports.modified(COUNTER_FIELDS)
 
     @api.depends(
-        "bom_line_import_ids",
-        "bom_line_import_ids.state",
+        "line_count",
+        "line_pass_count",
+        "line_error_count",
+        "line_done_count",
     )
     def _compute_state(self):
         for bom_import in self:
-            lines = bom_import._get_import_lines()
-            line_states = lines.mapped("state")
-            if line_states and any([state == "error" for state in line_states]):
+            if bom_import.line_error_count:
                 bom_import.state = "error"
-            elif line_states and all([state == "done" for state in line_states]):
+            elif bom_import.line_count and (
+                bom_import.line_done_count == bom_import.line_count
+            ):
                 bom_import.state = "done"
-            elif line_states and all([state == "pass" for state in line_states]):
+            elif bom_import.line_count and (
+                bom_import.line_pass_count == bom_import.line_count
+            ):
                 bom_import.state = "pass"
             else:
                 bom_import.state = "2validate"
 
-    @api.depends(
-        "bom_line_import_ids",
-        "bom_line_import_ids.log_info",
-    )
-    def _compute_log_info(self):
-        for bom_import in self:
-            lines = bom_import._get_import_lines()
-            logged_lines = lines.filtered("log_info")
-            if logged_lines:
-                bom_import.log_info = "\n".join(logged_lines.mapped("log_info"))
-            else:
-                bom_import.log_info = ""
-
     def action_bom_import_boms(self):
         action = self.env.ref("mrp.mrp_bom_form_action")
         action_dict = action and action.read()[0]
@@ -178,47 +381,163 @@ class MrpBomImport(models.Model):
 
     def action_import_bom(self):
         self.ensure_one()
+        if self.upsert:
+            self.previous_bom_ids |= self._get_import_lines().mapped("bom_id")
         (self._get_import_lines()).unlink()
-        book = base64.decodebytes(self.data)
-        reader = xlrd.open_workbook(file_contents=book)
+        self.write(
+            {
+                "imported_row_count": 0,
+                "bom_created_count": 0,
+                "bom_updated_count": 0,
+                "bom_unchanged_count": 0,
+                "bom_archived_count": 0,
+            }
+        )
+        bom_import_line_obj = self.env["mrp.bom.line.import"]
+        chunk_size = max(self.import_chunk_size, 1)
+        column_errors = defaultdict(list)
         try:
-            sheet_list = reader.sheet_names()
-            for sheet_name in sheet_list:
-                sheet = reader.sheet_by_name(sheet_name)
-                bom_import_line_obj = self.env["mrp.bom.line.import"]
-                keys = [c.value for c in sheet.row(0)]
-                for counter in range(1, sheet.nrows):
-                    row_values = sheet.row_values(counter, 0, end_colx=sheet.ncols)
-                    values = dict(zip(keys, row_values))
-                    line_data = self._get_line_values(values)
-                    if line_data:
-                        bom_import_line_obj.create(line_data)
+            rows = self._read_file_rows()
+            chunk = list(islice(rows, chunk_size))
+            while chunk:
+                lines_data = self._get_lines_values(
+                    chunk,
+                    column_errors=column_errors,
+                    first_row=self.imported_row_count + 1,
+                )
+                if lines_data:
+                    bom_import_line_obj.create(lines_data)
+                self.imported_row_count += len(chunk)
+                bom_import_line_obj.flush()
+                bom_import_line_obj.invalidate_cache()
+                _logger.info(
+                    "BoM import %s: %s rows read", self.id, self.imported_row_count
+                )
+                chunk = list(islice(rows, chunk_size))
         except Exception:
             raise ValidationError(_("This is not a valid file."))
+        self.column_error_info = self._get_column_error_info(column_errors)
 
-    def _get_line_values(self, row_values):
-        self.ensure_one()
-        if (
-            not row_values.get("Product Name")
-            and not row_values.get("Product Code")
-            and not row_values.get("Quantity", 0.0)
-        ):
-            return {}
-        values = {
-            "bom_ref": convert2str(row_values.get("BoM Ref", "")),
-            "product_name": convert2str(row_values.get("Product Name", "")),
-            "product_ref": convert2str(row_values.get("Product Code", "")),
-            "quantity": check_number(row_values.get("Quantity", 0.0)),
-            "weight": check_number(row_values.get("Weight", 0.0)),
-            "bom_code": convert2str(row_values.get("Parent Code", "")),
-            "bom_name": convert2str(row_values.get("Parent Name", "")),
+    def _get_column_error_info(self, column_errors):
+        messages = {
+            "number": _("Column {}: {} values are not numbers (rows {})."),
         }
-        values.update(
-            {
-                "bom_import_id": self.id,
-            }
+        log_info = []
+        for (column, column_type), rows in column_errors.items():
+            if rows and column_type in messages:
+                rows_info = ", ".join(str(row) for row in rows[:10])
+                if len(rows) > 10:
+                    rows_info += ", ..."
+                log_info.append(
+                    messages[column_type].format(column, len(rows), rows_info)
+                )
+        return "\n".join(log_info)
+
+    def _read_file_rows(self):
+        """Yield a dict per data row of the file, keyed by column header."""
+        self.ensure_one()
+        book = base64.decodebytes(self.data)
+        filename = (self.filename or "").lower()
+        if filename.endswith(".csv"):
+            return self._read_csv_rows(book)
+        if filename.endswith(".xlsx") and openpyxl:
+            return self._read_xlsx_rows(book)
+        return self._read_xls_rows(book)
+
+    def _read_csv_rows(self, book):
+        content = io.StringIO(book.decode("utf-8-sig"))
+        try:
+            dialect = csv.Sniffer().sniff(content.read(4096), delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        content.seek(0)
+        reader = csv.reader(content, dialect)
+        keys = next(reader, [])
+        for row_values in reader:
+            yield dict(zip(keys, row_values))
+
+    def _read_xlsx_rows(self, book):
+        reader = openpyxl.load_workbook(
+            io.BytesIO(book), read_only=True, data_only=True
         )
-        return values
+        try:
+            for sheet in reader.worksheets:
+                rows = sheet.iter_rows(values_only=True)
+                keys = next(rows, ())
+                for row_values in rows:
+                    yield dict(
+                        zip(
+                            keys,
+                            ("" if value is None else value for value in row_values),
+                        )
+                    )
+        finally:
+            reader.close()
+
+    def _read_xls_rows(self, book):
+        reader = xlrd.open_workbook(file_contents=book, on_demand=True)
+        for sheet_name in reader.sheet_names():
+            sheet = reader.sheet_by_name(sheet_name)
+            if not sheet.nrows:
+                continue
+            keys = [c.value for c in sheet.row(0)]
+            for counter in range(1, sheet.nrows):
+                row_values = sheet.row_values(counter, 0, end_colx=sheet.ncols)
+                yield dict(zip(keys, row_values))
+            reader.unload_sheet(sheet_name)
+
+    def _get_import_columns(self):
+        """Return {column name: (import line field, column type)}.
+
+        The column type is a key of ``COLUMN_NORMALIZERS``. Modules adding
+        columns to the file extend this mapping.
+        """
+        return {
+            "BoM Ref": ("bom_ref", "text"),
+            "Product Name": ("product_name", "text"),
+            "Product Code": ("product_ref", "text"),
+            "Quantity": ("quantity", "number"),
+            "Weight": ("weight", "number"),
+            "Parent Code": ("bom_code", "text"),
+            "Parent Name": ("bom_name", "text"),
+        }
+
+    def _get_lines_values(self, rows, column_errors=None, first_row=1):
+        """Convert file rows to import line values one column at a time.
+
+        Empty rows are skipped. The row numbers of the values that cannot be
+        converted are added to ``column_errors`` by (column, column type).
+        """
+        self.ensure_one()
+        row_numbers = []
+        line_rows = []
+        for row_number, row_values in enumerate(rows, start=first_row):
+            if (
+                row_values.get("Product Name")
+                or row_values.get("Product Code")
+                or row_values.get("Quantity", 0.0)
+            ):
+                row_numbers.append(row_number)
+                line_rows.append(row_values)
+        columns = {}
+        for column, (field_name, column_type) in self._get_import_columns().items():
+            values, errors = COLUMN_NORMALIZERS[column_type](
+                [row_values.get(column, "") for row_values in line_rows]
+            )
+            columns[field_name] = values
+            if column_errors is not None and errors:
+                column_errors[(column, column_type)].extend(
+                    row_numbers[position] for position in errors
+                )
+        return [
+            dict(zip(columns, line_values), bom_import_id=self.id)
+            for line_values in zip(*columns.values())
+        ]
+
+    def _get_line_values(self, row_values):
+        self.ensure_one()
+        lines_values = self._get_lines_values([row_values])
+        return lines_values and lines_values[0] or {}
 
     def action_validate_lines(self):
         lines = (self._get_import_lines()).filtered(
@@ -229,6 +548,48 @@ class MrpBomImport(models.Model):
         lines = (self._get_import_lines()).filtered(
             lambda x: x.state == "pass")
         lines.action_process_lines()
+        self._archive_removed_boms()
+
+    def _add_bom_summary(self, bom_summary):
+        """Add the ``bom_summary`` counts ({(import id, result): count})."""
+        for (import_id, result), count in bom_summary.items():
+            bom_import = self.browse(import_id)
+            field_name = "bom_{}_count".format(result)
+            bom_import[field_name] += count
+
+    def _archive_removed_boms(self):
+        for bom_import in self.filtered(lambda x: x.upsert and x.state == "done"):
+            removed_boms = bom_import.previous_bom_ids.filtered(
+                "active"
+            ) - bom_import._get_import_lines().mapped("bom_id")
+            removed_boms.write({"active": False})
+            bom_import.write(
+                {
+                    "bom_archived_count": bom_import.bom_archived_count
+                    + len(removed_boms),
+                    "previous_bom_ids": [(5,)],
+                }
+            )
+
+    def _create_job(self, job_type):
+        jobs = self.env["mrp.bom.import.job"].create(
+            [
+                {
+                    "bom_import_id": bom_import.id,
+                    "job_type": job_type,
+                    "batch_size": bom_import.job_batch_size,
+                }
+                for bom_import in self
+            ]
+        )
+        self.env.ref("mrp_bom_import.ir_cron_mrp_bom_import_job")._trigger()
+        return jobs
+
+    def action_validate_lines_job(self):
+        self._create_job("validate")
+
+    def action_process_lines_job(self):
+        self._create_job("process")
 
     def button_open_bom_component_import_line(self):
         self.ensure_one()
@@ -256,6 +617,7 @@ class MrpBomLineImport(models.Model):
         comodel_name="mrp.bom.import",
         string="BoM Import",
         ondelete="cascade",
+        index=True,
     )
     product_name = fields.Char(string="Product name")
     product_ref = fields.Char(string="Product code")
@@ -274,6 +636,7 @@ class MrpBomLineImport(models.Model):
     bom_id = fields.Many2one(
         comodel_name="mrp.bom",
         string="BoM",
+        index=True,
     )
     bom_line_id = fields.Many2one(
         string="BoM Line",
@@ -289,20 +652,157 @@ class MrpBomLineImport(models.Model):
         related="bom_product_id.bom_count",
         store=True)
 
-    def _check_product(self):
+    @api.model_create_multi
+    def create(self, vals_list):
+        self._flush_import_counters(
+            [vals.get("bom_import_id") for vals in vals_list]
+        )
+        lines = super(MrpBomLineImport, self).create(vals_list)
+        lines._update_import_counters({}, lines._get_counter_snapshot())
+        return lines
+
+    def write(self, vals):
+        if not {"bom_import_id", "state", "log_info", "bom_id"}.intersection(vals):
+            return super(MrpBomLineImport, self).write(vals)
+        self._flush_import_counters(
+            self.mapped("bom_import_id").ids + [vals.get("bom_import_id")]
+        )
+        old_snapshot = self._get_counter_snapshot()
+        result = super(MrpBomLineImport, self).write(vals)
+        self._update_import_counters(old_snapshot, self._get_counter_snapshot())
+        return result
+
+    def unlink(self):
+        self._flush_import_counters(self.mapped("bom_import_id").ids)
+        old_snapshot = self._get_counter_snapshot()
+        result = super(MrpBomLineImport, self).unlink()
+        self.browse()._update_import_counters(old_snapshot, {})
+        return result
+
+    def _flush_import_counters(self, import_ids):
+        """Compute the pending counters of new imports before the lines change,
+        so that the changed lines are not counted twice."""
+        bom_imports = self.env["mrp.bom.import"].browse(
+            list({import_id for import_id in import_ids if import_id})
+        )
+        bom_imports.flush(COUNTER_FIELDS, bom_imports)
+
+    def _get_counter_snapshot(self):
+        return {
+            line.id: (
+                line.bom_import_id.id,
+                line.state,
+                bool(line.log_info),
+                line.bom_id.id,
+            )
+            for line in self
+        }
+
+    def _update_import_counters(self, old_snapshot, new_snapshot):
+        """Update the import counters from the lines values before and after
+        a change, without reading the other lines of the imports."""
+        deltas = defaultdict(lambda: defaultdict(int))
+        for snapshot, sign in ((old_snapshot, -1), (new_snapshot, 1)):
+            for import_id, state, logged, bom_id in snapshot.values():
+                if not import_id:
+                    continue
+                import_deltas = deltas[import_id]
+                import_deltas["line_count"] += sign
+                if state in LINE_COUNT_FIELDS:
+                    import_deltas[LINE_COUNT_FIELDS[state]] += sign
+                if logged:
+                    import_deltas["log_count"] += sign
+        old_boms = {
+            (import_id, bom_id)
+            for import_id, state, logged, bom_id in old_snapshot.values()
+            if import_id and bom_id
+        }
+        new_boms = Counter(
+            (import_id, bom_id)
+            for import_id, state, logged, bom_id in new_snapshot.values()
+            if import_id and bom_id
+        )
+        changed_boms = old_boms.symmetric_difference(new_boms)
+        if changed_boms:
+            bom_line_counts = self._get_bom_line_counts(changed_boms)
+            for key in changed_boms:
+                if key in old_boms and not bom_line_counts.get(key):
+                    deltas[key[0]]["bom_count"] -= 1
+                elif key in new_boms and bom_line_counts.get(key) == new_boms[key]:
+                    deltas[key[0]]["bom_count"] += 1
+        if deltas:
+            self.env["mrp.bom.import"]._apply_line_counter_deltas(deltas)
+
+    def _get_bom_line_counts(self, import_boms):
+        """Return the current number of lines of each (import, BoM) pair."""
+        groups = self.read_group(
+            [
+                ("bom_import_id", "in", list({key[0] for key in import_boms})),
+                ("bom_id", "in", list({key[1] for key in import_boms})),
+            ],
+            ["bom_import_id", "bom_id"],
+            ["bom_import_id", "bom_id"],
+            lazy=False,
+        )
+        return {
+            (group["bom_import_id"][0], group["bom_id"][0]): group["__count"]
+            for group in groups
+        }
+
+    def _get_product_index(self):
+        """Resolve every product and BoM product key of the lines at once.
+
+        Returns a dict of lookup tables (by name, by code and by code and
+        name) mapping each key to the list of matching product ids.
+        """
+        names = set()
+        codes = set()
+        for line in self:
+            if not line.product_id:
+                names.add(line.product_name)
+                codes.add(line.product_ref)
+            if not line.bom_product_id:
+                names.add(line.bom_name)
+                codes.add(line.bom_code)
+        names.discard(False)
+        codes.discard(False)
+        product_obj = self.env["product.product"]
+        product_ids = set()
+        for field_name, keys in (("name", names), ("default_code", codes)):
+            for chunk in split_every(1000, keys, list):
+                product_ids.update(product_obj.search([(field_name, "in", chunk)]).ids)
+        index = {
+            "name": defaultdict(list),
+            "code": defaultdict(list),
+            "code_name": defaultdict(list),
+        }
+        for product in product_obj.browse(product_ids):
+            index["name"][product.name].append(product.id)
+            if product.default_code:
+                index["code"][product.default_code].append(product.id)
+                index["code_name"][(product.default_code, product.name)].append(
+                    product.id
+                )
+        return index
+
+    def _lookup_product(self, product_index, name, code):
+        self.ensure_one()
+        if self.bom_import_id.product_found_by_code:
+            return product_index["code"].get(code, [])
+        if code:
+            return product_index["code_name"].get((code, name), [])
+        return product_index["name"].get(name, [])
+
+    def _check_product(self, product_index=None):
         self.ensure_one()
         log_info = ""
         if self.product_id:
             return self.product_id, log_info
-        product_obj = self.env["product.product"]
-        search_domain = [("name", "=", self.product_name)]
-        if self.product_ref:
-            search_domain = expression.AND(
-                [[("default_code", "=", self.product_ref)], search_domain]
-            )
-        if self.bom_import_id.product_found_by_code:
-            search_domain = [("default_code", "=", self.product_ref)]
-        products = product_obj.search(search_domain)
+        if product_index is None:
+            product_index = self._get_product_index()
+        products = self.env["product.product"].browse(
+            self._lookup_product(product_index, self.product_name, self.product_ref)
+        )
         if not products:
             products = False
             log_info = _("Error: Product not found.")
@@ -311,20 +811,16 @@ class MrpBomLineImport(models.Model):
             log_info = _("Error: More than one product found.")
         return products, log_info
 
-    def _check_bom_product(self):
+    def _check_bom_product(self, product_index=None):
         self.ensure_one()
         log_info = ""
         if self.bom_product_id:
             return self.bom_product_id, log_info
-        product_obj = self.env["product.product"]
-        search_domain = [("name", "=", self.bom_name)]
-        if self.bom_code:
-            search_domain = expression.AND(
-                [[("default_code", "=", self.bom_code)], search_domain]
-            )
-        if self.bom_import_id.product_found_by_code:
-            search_domain = [("default_code", "=", self.bom_code)]
-        products = product_obj.search(search_domain)
+        if product_index is None:
+            product_index = self._get_product_index()
+        products = self.env["product.product"].browse(
+            self._lookup_product(product_index, self.bom_name, self.bom_code)
+        )
         if not products:
             products = False
             log_info = _("Error: BoM product not found.")
@@ -334,37 +830,74 @@ class MrpBomLineImport(models.Model):
         return products, log_info
 
     def action_validate_lines(self):
-        for line in self.filtered(lambda x: x.state not in ("done")):
-            line_vals = {}
+        lines = self.filtered(lambda x: x.state not in ("done"))
+        product_index = lines._get_product_index()
+        lines_by_values = defaultdict(list)
+        line_products = []
+        for line in lines:
             log_info = ""
             product = bom_product = bom = False
-            product, product_log_info = line._check_product()
+            product, product_log_info = line._check_product(product_index)
             if product_log_info:
                 log_info += product_log_info
-            bom_product, bom_product_log_info = line._check_bom_product()
+            bom_product, bom_product_log_info = line._check_bom_product(
+                product_index
+            )
             if bom_product_log_info:
                 log_info += bom_product_log_info
             if not line.quantity:
                 log_info += _("Error: Quantity cannot be 0.")
             state = "error" if log_info else "pass"
-            line_vals.update(
-                {
-                    "product_id": product and product.id,
-                    "bom_product_id": bom_product and bom_product.id,
-                    "bom_id": bom and bom.id,
-                    "state": state,
-                    "log_info": log_info,
-                }
+            line_vals = (
+                ("bom_id", bom and bom.id),
+                ("state", state),
+                ("log_info", log_info),
             )
-            line.write(line_vals)
+            lines_by_values[line_vals].append(line.id)
+            line_products.append(
+                (
+                    line.id,
+                    product.id if product else None,
+                    bom_product.id if bom_product else None,
+                )
+            )
+        lines._write_line_products(line_products)
+        for line_vals, line_ids in lines_by_values.items():
+            self.browse(line_ids).write(dict(line_vals))
 
-    def _create_bom(self):
+    def _write_line_products(self, line_products):
+        """Set the products found for the import lines with one UPDATE per
+        chunk."""
+        if not line_products:
+            return
+        self.flush(["product_id", "bom_product_id"])
+        for chunk in split_every(10000, line_products, list):
+            self.env.cr.execute(
+                """
+                UPDATE mrp_bom_line_import AS import_line
+                SET product_id = data.product_id::integer,
+                    bom_product_id = data.bom_product_id::integer
+                FROM (VALUES {}) AS data (id, product_id, bom_product_id)
+                WHERE import_line.id = data.id
+                """.format(", ".join(["%s"] * len(chunk))),
+                chunk,
+            )
+        lines = self.browse([line[0] for line in line_products])
+        lines.invalidate_cache(["product_id", "bom_product_id"], lines.ids)
+        lines.modified(["product_id", "bom_product_id"])
+
+    def _prepare_bom_values(self):
         self.ensure_one()
-        bom = self.env["mrp.bom"].create({
+        return {
             "product_tmpl_id": self.bom_product_id.product_tmpl_id.id,
             "code": self.bom_ref,
             "product_qty": 1,
-            "product_uom_id": self.bom_product_id.uom_id.id})
+            "product_uom_id": self.bom_product_id.uom_id.id,
+        }
+
+    def _create_bom(self):
+        self.ensure_one()
+        bom = self.env["mrp.bom"].create(self._prepare_bom_values())
         return bom
 
     def generate_bom_line_values(self):
@@ -375,34 +908,216 @@ class MrpBomLineImport(models.Model):
             "product_uom_id": self.product_id.uom_id.id}
         return bom_line
 
+    def _get_lines_by_parent(self):
+        """Group the lines of the imports by import and parent product."""
+        lines_by_parent = defaultdict(list)
+        for line in self | self.mapped("bom_import_id.bom_line_import_ids"):
+            if line.bom_product_id:
+                key = (line.bom_import_id.id, line.bom_product_id.id)
+                lines_by_parent[key].append(line.id)
+        return lines_by_parent
+
+    def _get_children_by_parent(self, lines_by_parent):
+        """Return the parents of the same import used as components of each
+        parent, for multi-level imports."""
+        children_by_parent = {}
+        for key, line_ids in lines_by_parent.items():
+            children = set()
+            if self.env["mrp.bom.import"].browse(key[0]).multi_level:
+                for line in self.browse(line_ids):
+                    child_key = (key[0], line.product_id.id)
+                    if child_key in lines_by_parent:
+                        children.add(child_key)
+            children_by_parent[key] = children
+        return children_by_parent
+
+    def _sort_parents_topologically(self, children_by_parent):
+        """Order parents so that each one comes after its component parents.
+
+        Returns the ordered parents and the ones that are part of, or depend
+        on, a cycle.
+        """
+        ordered = []
+        sorted_keys = set()
+        remaining = list(children_by_parent)
+        while remaining:
+            ready = [
+                key for key in remaining if children_by_parent[key] <= sorted_keys
+            ]
+            if not ready:
+                break
+            ordered.extend(ready)
+            sorted_keys.update(ready)
+            remaining = [key for key in remaining if key not in sorted_keys]
+        return ordered, remaining
+
     def action_process_lines(self):
-        bom_product = []
-        for line in self.filtered(lambda x: x.state == "pass"):
+        lines_by_parent = self._get_lines_by_parent()
+        pending_by_parent = defaultdict(list)
+        for line in self.filtered(
+            lambda x: x.state == "pass" and not x.bom_id and x.bom_product_id
+        ):
+            key = (line.bom_import_id.id, line.bom_product_id.id)
+            pending_by_parent[key].append(line.id)
+        children_by_parent = self._get_children_by_parent(lines_by_parent)
+        ordered_keys, cyclic_keys = self._sort_parents_topologically(
+            children_by_parent
+        )
+        error_line_ids = defaultdict(list)
+        failed_keys = set(cyclic_keys)
+        for key in cyclic_keys:
+            error_line_ids[_("Error: Cyclic BoM structure.")].extend(
+                pending_by_parent.get(key, [])
+            )
+        existing_boms = self._get_existing_boms(pending_by_parent)
+        bom_summary = Counter()
+        bom_values = []
+        bom_parent_lines = []
+        bom_line_by_import_line = []
+        for key in ordered_keys:
+            same_parent = self.browse(lines_by_parent[key])
             log_info = ""
-            bom = False
-            if not line.bom_id and line.bom_product_id and line.bom_product_id not in bom_product:
-                state = "2validate"
-                same_parent = line.bom_import_id.bom_line_import_ids.filtered(
-                    lambda c: c.bom_product_id == line.bom_product_id)
-                if any([state.state == "error" for state in same_parent]):
-                    log_info = _("Error: There is another line with the " +
-                              "same parent product errors.")
-                    state = "error"
-                else:
-                    bom = line._create_bom()
-                    for l in same_parent:
-                        bom_line_values = l.generate_bom_line_values()
-                        bom_line_values.update({"bom_id": bom.id})
-                        bom_line = self.env["mrp.bom.line"].create(
-                            bom_line_values)
-                        l.write({
-                            "bom_id": bom.id,
-                            "bom_line_id": bom_line.id,
-                            "state": "done"})
-                    state = "done"
-                line.write(
-                    {
-                        "state": state,
-                        "log_info": log_info,
-                    }
+            if any([state == "error" for state in same_parent.mapped("state")]):
+                log_info = _(
+                    "Error: There is another line with the same parent product "
+                    "errors."
+                )
+            elif children_by_parent[key] & failed_keys:
+                log_info = _("Error: A component BoM of this parent has errors.")
+            if log_info:
+                failed_keys.add(key)
+            if key not in pending_by_parent:
+                continue
+            if log_info:
+                error_line_ids[log_info].extend(pending_by_parent[key])
+                continue
+            first_line = self.browse(pending_by_parent[key][0])
+            line_values = [line.generate_bom_line_values() for line in same_parent]
+            bom = existing_boms.get(first_line._get_bom_key())
+            if bom:
+                result, bom_lines = same_parent._sync_bom_lines(bom, line_values)
+                bom_summary[(key[0], result)] += 1
+                same_parent.write({"bom_id": bom.id, "state": "done", "log_info": ""})
+                bom_line_by_import_line.extend(bom_lines)
+                continue
+            values = first_line._prepare_bom_values()
+            values["bom_line_ids"] = [(0, 0, vals) for vals in line_values]
+            bom_values.append(values)
+            bom_parent_lines.append(same_parent)
+            bom_summary[(key[0], "created")] += 1
+        for log_info, line_ids in error_line_ids.items():
+            self.browse(line_ids).write({"state": "error", "log_info": log_info})
+        boms = self.env["mrp.bom"].create(bom_values)
+        for bom, same_parent in zip(boms, bom_parent_lines):
+            same_parent.write({"bom_id": bom.id, "state": "done", "log_info": ""})
+            bom_line_by_import_line.extend(
+                zip(same_parent.ids, bom.bom_line_ids.sorted("id").ids)
+            )
+        self._write_bom_lines(bom_line_by_import_line)
+        self.env["mrp.bom.import"]._add_bom_summary(bom_summary)
+
+    def _get_bom_key(self):
+        self.ensure_one()
+        return self.bom_product_id.product_tmpl_id.id, self.bom_ref or False
+
+    def _get_existing_boms(self, pending_by_parent):
+        """Return the current BoMs of the parents of upsert imports, by
+        product template and reference."""
+        upsert_lines = self.browse(
+            [
+                line_ids[0]
+                for key, line_ids in pending_by_parent.items()
+                if self.env["mrp.bom.import"].browse(key[0]).upsert
+            ]
+        )
+        if not upsert_lines:
+            return {}
+        bom_keys = [line._get_bom_key() for line in upsert_lines]
+        boms = self.env["mrp.bom"].search(
+            [
+                ("product_tmpl_id", "in", list({key[0] for key in bom_keys})),
+                ("code", "in", list({key[1] for key in bom_keys})),
+            ]
+        )
+        existing_boms = {}
+        for bom in boms:
+            existing_boms.setdefault((bom.product_tmpl_id.id, bom.code or False), bom)
+        return existing_boms
+
+    def _get_bom_line_key(self, values):
+        """Normalize BoM line values (quantities rounded to their field digits,
+        record ids) so that imported and existing components can be compared."""
+        bom_line_obj = self.env["mrp.bom.line"]
+        return tuple(
+            sorted(
+                (
+                    name,
+                    bom_line_obj._fields[name].convert_to_cache(
+                        value, bom_line_obj, validate=True
+                    ),
                 )
+                for name, value in values.items()
+            )
+        )
+
+    def _sync_bom_lines(self, bom, line_values):
+        """Update the components of an existing BoM with the import lines.
+
+        Components that did not change are kept, the rest are removed or
+        created. Returns whether the BoM was "updated" or "unchanged" and the
+        (import line, BoM line) pairs.
+        """
+        field_names = set().union(*line_values)
+        existing_by_key = defaultdict(list)
+        for bom_line in bom.bom_line_ids:
+            key = self._get_bom_line_key(
+                {name: bom_line[name] for name in field_names}
+            )
+            existing_by_key[key].append(bom_line.id)
+        bom_lines = []
+        new_lines = []
+        for line, values in zip(self, line_values):
+            matches = existing_by_key.get(self._get_bom_line_key(values))
+            if matches:
+                bom_lines.append((line.id, matches.pop(0)))
+            else:
+                new_lines.append((line.id, values))
+        removed_ids = [
+            bom_line_id
+            for bom_line_ids in existing_by_key.values()
+            for bom_line_id in bom_line_ids
+        ]
+        if not new_lines and not removed_ids:
+            return "unchanged", bom_lines
+        old_ids = bom.bom_line_ids.ids
+        bom.write(
+            {
+                "bom_line_ids": [(2, bom_line_id) for bom_line_id in removed_ids]
+                + [(0, 0, values) for line_id, values in new_lines]
+            }
+        )
+        created = bom.bom_line_ids.filtered(lambda x: x.id not in old_ids)
+        bom_lines.extend(
+            zip([line_id for line_id, values in new_lines], created.sorted("id").ids)
+        )
+        return "updated", bom_lines
+
+    def _write_bom_lines(self, bom_line_by_import_line):
+        """Link import lines to their BoM lines with one UPDATE per chunk."""
+        if not bom_line_by_import_line:
+            return
+        self.flush(["bom_line_id"])
+        for chunk in split_every(10000, bom_line_by_import_line, list):
+            self.env.cr.execute(
+                """
+                UPDATE mrp_bom_line_import AS import_line
+                SET bom_line_id = data.bom_line_id
+                FROM (VALUES {}) AS data (id, bom_line_id)
+                WHERE import_line.id = data.id
+                """.format(", ".join(["%s"] * len(chunk))),
+                chunk,
+            )
+        self.invalidate_cache(
+            ["bom_line_id"],
+            [line_id for line_id, bom_line_id in bom_line_by_import_line],
+        )
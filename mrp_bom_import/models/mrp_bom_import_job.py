@@ -0,0 +1,174 @@
+# Copyright 2026 AvanzOSC
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+import logging
+import threading
+import time
+
+from odoo import fields, models
+
+_logger = logging.getLogger(__name__)
+
+JOB_TYPES = [
+    ("validate", "Validate"),
+    ("process", "Process"),
+]
+
+JOB_STATUS = [
+    ("pending", "Pending"),
+    ("running", "Running"),
+    ("done", "Done"),
+    ("failed", "Failed"),
+]
+
+
+class MrpBomImportJob(models.Model):
+    _name = "mrp.bom.import.job"
+    _description = "BoM import background job"
+    _order = "id desc"
+
+    bom_import_id = fields.Many2one(
+        comodel_name="mrp.bom.import",
+        string="BoM Import",
+        required=True,
+        ondelete="cascade",
+    )
+    job_type = fields.Selection(
+        selection=JOB_TYPES,
+        string="Type",
+        required=True,
+    )
+    state = fields.Selection(
+        selection=JOB_STATUS,
+        string="Status",
+        default="pending",
+        required=True,
+    )
+    batch_size = fields.Integer(
+        string="Batch Size",
+        default=500,
+    )
+    last_line_id = fields.Integer(
+        string="Last Processed Line",
+        help="Lines up to this one are already committed, a resumed job "
+        "continues after it.",
+    )
+    processed_count = fields.Integer(string="Processed Lines")
+    error_message = fields.Text(string="Error")
+    batch_ids = fields.One2many(
+        comodel_name="mrp.bom.import.job.batch",
+        inverse_name="job_id",
+        string="Batches",
+    )
+
+    def _get_line_domain(self):
+        self.ensure_one()
+        domain = [
+            ("bom_import_id", "=", self.bom_import_id.id),
+            ("id", ">", self.last_line_id),
+        ]
+        if self.job_type == "validate":
+            domain.append(("state", "!=", "done"))
+        else:
+            domain.append(("state", "=", "pass"))
+        return domain
+
+    def _run_batch(self, lines):
+        self.ensure_one()
+        if self.job_type == "validate":
+            lines.action_validate_lines()
+        else:
+            lines.action_process_lines()
+
+    def _commit(self):
+        if not getattr(threading.current_thread(), "testing", False):
+            self.env.cr.commit()  # pylint: disable=invalid-commit
+
+    def _rollback(self):
+        """Undo the failed batch, the previous ones are already committed.
+
+        Under tests nothing is committed, and rolling back would undo the
+        whole test transaction.
+        """
+        if not getattr(threading.current_thread(), "testing", False):
+            self.env.cr.rollback()
+            self.env.clear()
+
+    def _run(self):
+        line_obj = self.env["mrp.bom.line.import"]
+        for job in self:
+            job.write({"state": "running", "error_message": False})
+            job._commit()
+            try:
+                while True:
+                    lines = line_obj.search(
+                        job._get_line_domain(),
+                        order="id",
+                        limit=max(job.batch_size, 1),
+                    )
+                    if not lines:
+                        break
+                    date_start = fields.Datetime.now()
+                    start = time.perf_counter()
+                    job._run_batch(lines)
+                    duration = time.perf_counter() - start
+                    job.write(
+                        {
+                            "last_line_id": lines[-1].id,
+                            "processed_count": job.processed_count + len(lines),
+                            "batch_ids": [
+                                (
+                                    0,
+                                    0,
+                                    {
+                                        "first_line_id": lines[0].id,
+                                        "last_line_id": lines[-1].id,
+                                        "line_count": len(lines),
+                                        "date_start": date_start,
+                                        "duration": duration,
+                                    },
+                                )
+                            ],
+                        }
+                    )
+                    job._commit()
+                    _logger.info(
+                        "BoM import job %s: %s lines in %.2fs",
+                        job.id,
+                        len(lines),
+                        duration,
+                    )
+                if job.job_type == "process":
+                    job.bom_import_id._archive_removed_boms()
+                job.state = "done"
+            except Exception as error:
+                job._rollback()
+                _logger.exception("BoM import job %s failed", job.id)
+                job.write({"state": "failed", "error_message": str(error)})
+            job._commit()
+
+    def action_retry(self):
+        self.filtered(lambda x: x.state == "failed").write({"state": "pending"})
+        self.env.ref("mrp_bom_import.ir_cron_mrp_bom_import_job")._trigger()
+
+    def _cron_run_jobs(self):
+        jobs = self.search([("state", "in", ("pending", "running"))], order="id")
+        jobs._run()
+
+
+class MrpBomImportJobBatch(models.Model):
+    _name = "mrp.bom.import.job.batch"
+    _description = "BoM import background job batch"
+    _order = "id"
+
+    job_id = fields.Many2one(
+        comodel_name="mrp.bom.import.job",
+        string="Job",
+        required=True,
+        ondelete="cascade",
+    )
+    first_line_id = fields.Integer(string="First Line")
+    last_line_id = fields.Integer(string="Last Line")
+    line_count = fields.Integer(string="Lines")
+    date_start = fields.Datetime(string="Start Date")
+    duration = fields.Float(string="Duration (s)")
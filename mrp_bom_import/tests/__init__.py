@@ -0,0 +1,2 @@
+from . import test_mrp_bom_import
+from . import test_mrp_bom_import_benchmark
@@ -0,0 +1,144 @@
+# Copyright 2026 AvanzOSC
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+import base64
+import csv
+import io
+import logging
+import time
+import tracemalloc
+
+from odoo.tests import common
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+class MrpBomImportBenchmarkCommon(common.SavepointCase):
+    """Generate a synthetic BoM file, as CSV or as an xlsx workbook, and
+    measure import, validation and processing: rows per second, SQL queries
+    and peak Python memory."""
+
+    components_per_parent = 10
+    component_count = 500
+    import_chunk_size = 5000
+    max_queries_per_row = 5
+
+    @classmethod
+    def setUpClass(cls):
+        super(MrpBomImportBenchmarkCommon, cls).setUpClass()
+        cls.bom_import_obj = cls.env["mrp.bom.import"]
+        cls.product_obj = cls.env["product.product"]
+        cls.components = cls._create_products("Component", cls.component_count)
+
+    @classmethod
+    def _create_products(cls, name, count):
+        return cls.product_obj.create(
+            [
+                {
+                    "name": "Benchmark {} {}".format(name, index),
+                    "default_code": "BENCH-{}-{}".format(name.upper(), index),
+                }
+                for index in range(count)
+            ]
+        )
+
+    def _get_header(self):
+        return [
+            "BoM Ref",
+            "Product Name",
+            "Product Code",
+            "Quantity",
+            "Weight",
+            "Parent Code",
+            "Parent Name",
+        ]
+
+    def _get_row(self, index, parent, component):
+        return [
+            "BENCH-BOM-{}".format(parent[0]),
+            component[1],
+            component[0],
+            index % 5 + 1,
+            0.5,
+            parent[0],
+            parent[1],
+        ]
+
+    def _generate_rows(self, row_count, parents):
+        parent_keys = [(parent.default_code, parent.name) for parent in parents]
+        component_keys = [
+            (component.default_code, component.name) for component in self.components
+        ]
+        yield self._get_header()
+        for index in range(row_count):
+            parent = parent_keys[index // self.components_per_parent % len(parents)]
+            component = component_keys[index % len(component_keys)]
+            yield self._get_row(index, parent, component)
+
+    def _generate_file(self, row_count, parents, file_format="csv"):
+        rows = self._generate_rows(row_count, parents)
+        if file_format == "xlsx":
+            return base64.b64encode(self._write_xlsx_file(rows))
+        return base64.b64encode(self._write_csv_file(rows))
+
+    def _write_csv_file(self, rows):
+        output = io.StringIO()
+        csv.writer(output).writerows(rows)
+        return output.getvalue().encode()
+
+    def _write_xlsx_file(self, rows):
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        for row in rows:
+            sheet.append(row)
+        output = io.BytesIO()
+        workbook.save(output)
+        return output.getvalue()
+
+    def _run_phase(self, phase, method, row_count):
+        self.env["base"].flush()
+        query_count = self.env.cr.sql_log_count
+        tracemalloc.start()
+        start = time.perf_counter()
+        method()
+        self.env["base"].flush()
+        duration = time.perf_counter() - start
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        query_count = self.env.cr.sql_log_count - query_count
+        _logger.info(
+            "BoM import benchmark, %s rows, %s: %.2fs, %.0f rows/s, %s queries, "
+            "%.1f MiB peak memory",
+            row_count,
+            phase,
+            duration,
+            row_count / duration if duration else 0.0,
+            query_count,
+            peak_memory / 1024 / 1024,
+        )
+        self.assertLessEqual(query_count, row_count * self.max_queries_per_row)
+
+    def _run_benchmark(self, row_count, file_format="csv"):
+        parents = self._create_products(
+            "Parent {}".format(row_count),
+            max(row_count // self.components_per_parent, 1),
+        )
+        bom_import = self.bom_import_obj.create(
+            {
+                "data": self._generate_file(row_count, parents, file_format),
+                "filename": "benchmark_{}.{}".format(row_count, file_format),
+                "import_chunk_size": self.import_chunk_size,
+            }
+        )
+        self._run_phase("import", bom_import.action_import_bom, row_count)
+        self.assertEqual(bom_import.line_count, row_count)
+        self._run_phase("validate", bom_import.action_validate_lines, row_count)
+        self.assertEqual(bom_import.line_pass_count, row_count)
+        self._run_phase("process", bom_import.action_process_lines, row_count)
+        self.assertEqual(bom_import.line_done_count, row_count)
+        self.assertEqual(bom_import.bom_count, len(parents))
+        return bom_import
@@ -0,0 +1,340 @@
+# Copyright 2026 AvanzOSC
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+import base64
+import csv
+import io
+from unittest.mock import patch
+
+from odoo.exceptions import UserError
+from odoo.tests import common
+
+
+class TestMrpBomImport(common.SavepointCase):
+    @classmethod
+    def setUpClass(cls):
+        super(TestMrpBomImport, cls).setUpClass()
+        cls.bom_import_obj = cls.env["mrp.bom.import"]
+        cls.product_obj = cls.env["product.product"]
+        cls.parent = cls.product_obj.create(
+            {"name": "Import Parent", "default_code": "IMP-PARENT"}
+        )
+        cls.other_parent = cls.product_obj.create(
+            {"name": "Import Other Parent", "default_code": "IMP-OTHER"}
+        )
+        cls.components = cls.product_obj.create(
+            [
+                {
+                    "name": "Import Component {}".format(index),
+                    "default_code": "IMP-COMP-{}".format(index),
+                }
+                for index in range(3)
+            ]
+        )
+
+    def _get_rows(self, quantities=(1.23456, 2, 3), parent=None):
+        parent = parent or self.parent
+        return [
+            [
+                "IMP-BOM",
+                component.name,
+                component.default_code,
+                quantity,
+                0.5,
+                parent.default_code,
+                parent.name,
+            ]
+            for component, quantity in zip(self.components, quantities)
+        ]
+
+    def _get_row(self, parent, component, quantity=1):
+        return [
+            "IMP-BOM-{}".format(parent.default_code),
+            component.name,
+            component.default_code,
+            quantity,
+            0.5,
+            parent.default_code,
+            parent.name,
+        ]
+
+    def _get_file(self, rows):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(
+            [
+                "BoM Ref",
+                "Product Name",
+                "Product Code",
+                "Quantity",
+                "Weight",
+                "Parent Code",
+                "Parent Name",
+            ]
+        )
+        writer.writerows(rows)
+        return base64.b64encode(output.getvalue().encode())
+
+    def _create_import(self, rows, **values):
+        values.update(
+            {"data": self._get_file(rows), "filename": "test_bom_import.csv"}
+        )
+        return self.bom_import_obj.create(values)
+
+    def _assert_counters(self, bom_import):
+        """Compare the counters kept by the lines with a fresh count."""
+        line_obj = self.env["mrp.bom.line.import"]
+        domain = [("bom_import_id", "=", bom_import.id)]
+        expected = {
+            "line_count": line_obj.search_count(domain),
+            "line_2validate_count": 0,
+            "line_pass_count": 0,
+            "line_error_count": 0,
+            "line_done_count": 0,
+            "log_count": len(
+                line_obj.search(domain).filtered(lambda x: x.log_info)
+            ),
+            "bom_count": len(
+                line_obj.read_group(
+                    domain + [("bom_id", "!=", False)], ["bom_id"], ["bom_id"]
+                )
+            ),
+        }
+        for group in line_obj.read_group(domain, ["state"], ["state"]):
+            expected["line_{}_count".format(group["state"])] = group["state_count"]
+        bom_import.invalidate_cache()
+        self.assertEqual(
+            {field_name: bom_import[field_name] for field_name in expected},
+            expected,
+        )
+        bom_import._compute_line_counters()
+        self.assertEqual(
+            {field_name: bom_import[field_name] for field_name in expected},
+            expected,
+        )
+
+    def _run_import(self, bom_import):
+        bom_import.action_import_bom()
+        bom_import.action_validate_lines()
+        bom_import.action_process_lines()
+
+    def test_reimport_unchanged_bom(self):
+        bom_import = self._create_import(self._get_rows(), upsert=True)
+        self._run_import(bom_import)
+        self.assertEqual(bom_import.state, "done")
+        self.assertEqual(bom_import.bom_created_count, 1)
+        bom = bom_import.bom_line_import_ids.mapped("bom_id")
+        bom_lines = bom.bom_line_ids
+        self.assertEqual(len(bom_lines), 3)
+        self._run_import(bom_import)
+        self.assertEqual(bom_import.state, "done")
+        self.assertEqual(bom_import.bom_unchanged_count, 1)
+        self.assertEqual(bom_import.bom_updated_count, 0)
+        self.assertEqual(bom_import.bom_created_count, 0)
+        self.assertEqual(bom_import.bom_archived_count, 0)
+        self.assertEqual(bom_import.bom_line_import_ids.mapped("bom_id"), bom)
+        self.assertEqual(bom.bom_line_ids, bom_lines)
+        self.assertTrue(bom.active)
+
+    def test_reimport_updated_bom(self):
+        bom_import = self._create_import(self._get_rows(), upsert=True)
+        self._run_import(bom_import)
+        bom = bom_import.bom_line_import_ids.mapped("bom_id")
+        bom_import.data = self._get_file(self._get_rows(quantities=(1, 2, 4)))
+        self._run_import(bom_import)
+        self.assertEqual(bom_import.bom_updated_count, 1)
+        self.assertEqual(bom_import.bom_unchanged_count, 0)
+        self.assertEqual(bom_import.bom_line_import_ids.mapped("bom_id"), bom)
+        self.assertEqual(
+            sorted(bom.bom_line_ids.mapped("product_qty")), [1.0, 2.0, 4.0]
+        )
+
+    def test_line_counters(self):
+        unknown_row = [
+            "IMP-OTHER-BOM",
+            "Unknown Component",
+            "IMP-UNKNOWN",
+            1,
+            0.5,
+            self.other_parent.default_code,
+            self.other_parent.name,
+        ]
+        rows = self._get_rows() + self._get_rows(parent=self.other_parent)
+        bom_import = self._create_import(rows + [unknown_row])
+        bom_import.action_import_bom()
+        self.assertEqual(bom_import.line_count, 7)
+        self.assertEqual(bom_import.line_2validate_count, 7)
+        self.assertEqual(bom_import.state, "2validate")
+        self._assert_counters(bom_import)
+        bom_import.action_validate_lines()
+        self.assertEqual(bom_import.line_pass_count, 6)
+        self.assertEqual(bom_import.line_error_count, 1)
+        self.assertEqual(bom_import.log_count, 1)
+        self.assertEqual(bom_import.state, "error")
+        self._assert_counters(bom_import)
+        bom_import.action_process_lines()
+        self.assertEqual(bom_import.line_done_count, 3)
+        self.assertEqual(bom_import.line_error_count, 4)
+        self.assertEqual(bom_import.bom_count, 1)
+        self._assert_counters(bom_import)
+        bom_import.bom_line_import_ids.filtered(
+            lambda x: x.state == "error"
+        ).unlink()
+        self.assertEqual(bom_import.line_count, 3)
+        self.assertEqual(bom_import.state, "done")
+        self._assert_counters(bom_import)
+        bom_import.bom_line_import_ids[:1].unlink()
+        self.assertEqual(bom_import.bom_count, 1)
+        self._assert_counters(bom_import)
+        bom_import.data = self._get_file(self._get_rows())
+        self._run_import(bom_import)
+        self.assertEqual(bom_import.line_count, 3)
+        self.assertEqual(bom_import.line_done_count, 3)
+        self.assertEqual(bom_import.bom_count, 1)
+        self.assertEqual(bom_import.state, "done")
+        self._assert_counters(bom_import)
+        bom_import.bom_line_import_ids.unlink()
+        self.assertEqual(bom_import.bom_count, 0)
+        self.assertEqual(bom_import.state, "2validate")
+        self._assert_counters(bom_import)
+
+    def test_sort_parents_topologically(self):
+        line_obj = self.env["mrp.bom.line.import"]
+        ordered, cyclic = line_obj._sort_parents_topologically(
+            {"top": {"middle", "bottom"}, "middle": {"bottom"}, "bottom": set()}
+        )
+        self.assertEqual(ordered, ["bottom", "middle", "top"])
+        self.assertEqual(cyclic, [])
+        ordered, cyclic = line_obj._sort_parents_topologically(
+            {"top": {"first"}, "first": {"second"}, "second": {"first"}}
+        )
+        self.assertEqual(ordered, [])
+        self.assertEqual(sorted(cyclic), ["first", "second", "top"])
+
+    def test_multi_level_bom(self):
+        component, other_component, last_component = self.components
+        rows = [
+            self._get_row(self.parent, self.other_parent),
+            self._get_row(self.parent, component),
+            self._get_row(self.other_parent, other_component),
+            self._get_row(self.other_parent, last_component),
+        ]
+        bom_import = self._create_import(rows, multi_level=True)
+        self._run_import(bom_import)
+        self.assertEqual(bom_import.state, "done")
+        self.assertEqual(bom_import.bom_created_count, 2)
+        lines = bom_import.bom_line_import_ids
+        bom = lines.filtered(lambda x: x.bom_product_id == self.parent).bom_id
+        other_bom = lines.filtered(
+            lambda x: x.bom_product_id == self.other_parent
+        ).bom_id
+        self.assertEqual(len(bom), 1)
+        self.assertEqual(len(other_bom), 1)
+        self.assertLess(other_bom.id, bom.id)
+        self.assertEqual(
+            bom.bom_line_ids.mapped("product_id"), self.other_parent | component
+        )
+        self.assertEqual(
+            other_bom.bom_line_ids.mapped("product_id"),
+            other_component | last_component,
+        )
+
+    def test_cyclic_bom(self):
+        top_parent = self.product_obj.create(
+            {"name": "Import Top Parent", "default_code": "IMP-TOP"}
+        )
+        rows = [
+            self._get_row(top_parent, self.parent),
+            self._get_row(self.parent, self.other_parent),
+            self._get_row(self.parent, self.components[0]),
+            self._get_row(self.other_parent, self.parent),
+        ]
+        bom_import = self._create_import(rows, multi_level=True)
+        self._run_import(bom_import)
+        self.assertEqual(bom_import.state, "error")
+        lines = bom_import.bom_line_import_ids
+        self.assertFalse(lines.mapped("bom_id"))
+        self.assertEqual(set(lines.mapped("state")), {"error"})
+        self.assertEqual(
+            set(lines.mapped("log_info")), {"Error: Cyclic BoM structure."}
+        )
+        self._assert_counters(bom_import)
+
+    def test_multi_level_component_error(self):
+        component, other_component = self.components[:2]
+        unknown_row = self._get_row(self.other_parent, other_component)
+        unknown_row[1:3] = ["Unknown Component", "IMP-UNKNOWN"]
+        rows = [
+            self._get_row(self.parent, self.other_parent),
+            self._get_row(self.parent, component),
+            self._get_row(self.other_parent, other_component),
+            unknown_row,
+        ]
+        bom_import = self._create_import(rows, multi_level=True)
+        self._run_import(bom_import)
+        self.assertEqual(bom_import.state, "error")
+        lines = bom_import.bom_line_import_ids
+        self.assertFalse(lines.mapped("bom_id"))
+        parent_lines = lines.filtered(lambda x: x.bom_product_id == self.parent)
+        self.assertEqual(
+            set(parent_lines.mapped("log_info")),
+            {"Error: A component BoM of this parent has errors."},
+        )
+        other_lines = lines - parent_lines
+        self.assertEqual(set(other_lines.mapped("state")), {"error"})
+        self.assertEqual(
+            other_lines.filtered(lambda x: x.product_id).log_info,
+            "Error: There is another line with the same parent product errors.",
+        )
+        self._assert_counters(bom_import)
+
+    def _create_job_import(self):
+        rows = self._get_rows() + self._get_rows(parent=self.other_parent)
+        bom_import = self._create_import(rows, job_batch_size=2)
+        bom_import.action_import_bom()
+        return bom_import
+
+    def test_job_batches(self):
+        bom_import = self._create_job_import()
+        job = bom_import._create_job("validate")
+        job._run()
+        lines = bom_import.bom_line_import_ids.sorted("id")
+        self.assertEqual(job.state, "done")
+        self.assertEqual(job.processed_count, 6)
+        self.assertEqual(job.last_line_id, lines[-1].id)
+        self.assertEqual(job.batch_ids.mapped("line_count"), [2, 2, 2])
+        self.assertEqual(
+            [(batch.first_line_id, batch.last_line_id) for batch in job.batch_ids],
+            [(lines[index].id, lines[index + 1].id) for index in (0, 2, 4)],
+        )
+        self.assertEqual(bom_import.line_pass_count, 6)
+
+    def test_job_retry(self):
+        bom_import = self._create_job_import()
+        job = bom_import._create_job("validate")
+        job_class = type(job)
+        run_batch = job_class._run_batch
+        batches = []
+
+        def _run_batch(job, lines):
+            batches.append(lines)
+            if len(batches) == 2:
+                raise UserError("Batch failed")
+            return run_batch(job, lines)
+
+        with patch.object(job_class, "_run_batch", _run_batch):
+            job._run()
+        lines = bom_import.bom_line_import_ids.sorted("id")
+        self.assertEqual(job.state, "failed")
+        self.assertEqual(job.error_message, "Batch failed")
+        self.assertEqual(job.last_line_id, lines[1].id)
+        self.assertEqual(job.processed_count, 2)
+        self.assertEqual(len(job.batch_ids), 1)
+        self.assertEqual(bom_import.line_pass_count, 2)
+        job.action_retry()
+        self.assertEqual(job.state, "pending")
+        job._run()
+        self.assertEqual(job.state, "done")
+        self.assertEqual(job.processed_count, 6)
+        self.assertEqual(job.batch_ids.mapped("line_count"), [2, 2, 2])
+        self.assertEqual(job.batch_ids[1].first_line_id, lines[2].id)
+        self.assertEqual(bom_import.line_pass_count, 6)
@@ -0,0 +1,31 @@
+# Copyright 2026 AvanzOSC
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+import unittest
+
+from odoo.tests import tagged
+
+from .common import MrpBomImportBenchmarkCommon, openpyxl
+
+
+@tagged("-at_install", "post_install", "-standard", "benchmark")
+class TestMrpBomImportBenchmark(MrpBomImportBenchmarkCommon):
+    def test_benchmark_1k(self):
+        self._run_benchmark(1000)
+
+    def test_benchmark_10k(self):
+        self._run_benchmark(10000)
+
+    def test_benchmark_100k(self):
+        self._run_benchmark(100000)
+
+    @unittest.skipUnless(openpyxl, "openpyxl is not installed")
+    def test_benchmark_1k_xlsx(self):
+        self._run_benchmark(1000, "xlsx")
+
+    @unittest.skipUnless(openpyxl, "openpyxl is not installed")
+    def test_benchmark_10k_xlsx(self):
+        self._run_benchmark(10000, "xlsx")
+
+    @unittest.skipUnless(openpyxl, "openpyxl is not installed")
+    def test_benchmark_100k_xlsx(self):
+        self._run_benchmark(100000, "xlsx")
@@ -3,21 +3,18 @@
 
 from odoo import fields, models
 
-from odoo.addons.mrp_bom_import.models.mrp_bom_import import check_number
-
 
 class MrpBomImport(models.Model):
     _inherit = "mrp.bom.import"
 
-    def _get_line_values(self, row_values):
-        values = super(MrpBomImport, self)._get_line_values(row_values)
-        if values:
-            values.update(
-                {
-                    "long_cut": check_number(row_values.get("long_cut", 0.0)),
-                }
-            )
-        return values
+    def _get_import_columns(self):
+        columns = super(MrpBomImport, self)._get_import_columns()
+        columns.update(
+            {
+                "long_cut": ("long_cut", "number"),
+            }
+        )
+        return columns
 
 
 class MrpBomLineImport(models.Model):
@@ -0,0 +1 @@
+from . import test_mrp_cut_bom_import_benchmark
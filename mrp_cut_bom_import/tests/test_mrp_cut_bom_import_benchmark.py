@@ -0,0 +1,44 @@
+# Copyright 2026 AvanzOSC
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+import unittest
+
+from odoo.tests import tagged
+
+from odoo.addons.mrp_bom_import.tests.common import (
+    MrpBomImportBenchmarkCommon,
+    openpyxl,
+)
+
+
+@tagged("-at_install", "post_install", "-standard", "benchmark")
+class TestMrpCutBomImportBenchmark(MrpBomImportBenchmarkCommon):
+    def _get_header(self):
+        return super(TestMrpCutBomImportBenchmark, self)._get_header() + [
+            "long_cut"
+        ]
+
+    def _get_row(self, index, parent, component):
+        return super(TestMrpCutBomImportBenchmark, self)._get_row(
+            index, parent, component
+        ) + [index % 3000 + 100]
+
+    def _run_benchmark(self, row_count, file_format="csv"):
+        bom_import = super(TestMrpCutBomImportBenchmark, self)._run_benchmark(
+            row_count, file_format
+        )
+        bom_lines = bom_import.bom_line_import_ids.mapped("bom_line_id")
+        self.assertTrue(all(bom_lines.mapped("long_cut")))
+        return bom_import
+
+    def test_benchmark_1k(self):
+        self._run_benchmark(1000)
+
+    def test_benchmark_10k(self):
+        self._run_benchmark(10000)
+
+    def test_benchmark_100k(self):
+        self._run_benchmark(100000)
+
+    @unittest.skipUnless(openpyxl, "openpyxl is not installed")
+    def test_benchmark_10k_xlsx(self):
+        self._run_benchmark(10000, "xlsx")